@@ -0,0 +1,104 @@
+"""Parity check of a summarization backend against the fp32 torch baseline.
+
+Each backend runs in its own process so resident memory is measured in isolation. Generation
+is greedy (sampling disabled) so differences come from the backend, not the RNG.
+
+    pip install -r requirements-parity.txt
+    python -m api.backend_parity --backend torch-int8 --samples 20
+"""
+import json
+import time
+import argparse
+import resource
+import statistics
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+# Imported up front so a missing optional dependency fails before any generation runs
+from rouge_score import rouge_scorer
+
+from . import config
+
+def _current_rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / 2**20
+
+def _measure(backend, texts, params, ratio):
+    from .summarization_model_handler import SummarizationModelHandler
+
+    baseline_rss = _current_rss_mb()
+    summarizer = SummarizationModelHandler(backend)
+    if summarizer.model is None:
+        raise RuntimeError(f"Backend {backend} failed to load.")
+    model_rss = _current_rss_mb() - baseline_rss
+
+    summaries, latencies = [], []
+    for text in texts:
+        start = time.perf_counter()
+        summaries.append(summarizer.summarize_batch([text], params, ratio=ratio)[0])
+        latencies.append(time.perf_counter() - start)
+    return {
+        "backend": backend,
+        "summaries": summaries,
+        "latency_p50_s": statistics.median(latencies),
+        "latency_mean_s": statistics.fmean(latencies),
+        "model_rss_mb": model_rss,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+def run_backend(backend, texts, params, ratio):
+    with ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context("spawn")) as executor:
+        return executor.submit(_measure, backend, texts, params, ratio).result()
+
+def compare(baseline, candidate):
+    scorer = rouge_scorer.RougeScorer(["rouge1", "rouge2", "rougeL"], use_stemmer=True)
+    scores = [scorer.score(ref, hyp) for ref, hyp in zip(baseline["summaries"], candidate["summaries"])]
+    speedup = baseline["latency_p50_s"] / candidate["latency_p50_s"]
+    memory_reduction = baseline["model_rss_mb"] / max(candidate["model_rss_mb"], 1e-6)
+    return {
+        "backend": candidate["backend"],
+        "samples": len(scores),
+        "exact_match": sum(a == b for a, b in zip(baseline["summaries"], candidate["summaries"])) / len(scores),
+        **{f"{name}_f": statistics.fmean(s[name].fmeasure for s in scores) for name in ("rouge1", "rouge2", "rougeL")},
+        "baseline_latency_p50_s": baseline["latency_p50_s"],
+        "candidate_latency_p50_s": candidate["latency_p50_s"],
+        "speedup": speedup,
+        "baseline_model_rss_mb": baseline["model_rss_mb"],
+        "candidate_model_rss_mb": candidate["model_rss_mb"],
+        "memory_reduction": memory_reduction,
+        "meets_latency_target": speedup >= 2.0,
+        "meets_memory_target": memory_reduction >= 4.0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare a summarization backend against the fp32 torch baseline.")
+    parser.add_argument("--backend", required=True, choices=["torch-int8", "onnx"])
+    parser.add_argument("--samples", type=int, default=20)
+    parser.add_argument("--reading-time", default="10 minutes", choices=list(config.READING_TIME_RATIOS))
+    parser.add_argument("--output", default=None, help="Optional path for the JSON report")
+    args = parser.parse_args()
+    if args.backend == "onnx":
+        # Fail now rather than after the baseline run
+        import optimum.onnxruntime
+
+    df = pd.read_json(config.CLASSIFIED_BOOKS_PATH)
+    texts = df['content'].dropna().head(args.samples).tolist()
+    with open(config.BEST_PARAMS_PATH, 'r') as f:
+        params = json.load(f)
+    params = {k: v for k, v in params.items() if k not in ("do_sample", "temperature", "top_p")}
+    params["do_sample"] = False
+    ratio = config.READING_TIME_RATIOS[args.reading_time]
+
+    baseline = run_backend("torch", texts, params, ratio)
+    candidate = run_backend(args.backend, texts, params, ratio)
+    report = compare(baseline, candidate)
+
+    print(json.dumps(report, indent=4))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
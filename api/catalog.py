@@ -0,0 +1,146 @@
+"""Columnar, memory-mappable form of the classified catalog.
+
+`classified_books.json` is converted once into plain .npy arrays: label scores as a dense
+(books x labels) float32 matrix and each text column as an offsets array plus one UTF-8 byte
+blob. The API memory-maps them, so startup reads almost nothing and every uvicorn worker
+shares the same page-cache pages instead of holding a private copy of every book's content.
+
+    python -m api.catalog
+"""
+import os
+import json
+import time
+import uuid
+import shutil
+import logging
+
+import numpy as np
+import pandas as pd
+
+from . import config
+from .recommendation_logic import build_label_score_matrix
+from .id_lookup import IdLookup
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+TEXT_COLUMNS = ("title", "cover_url", "content")
+
+
+def _pack_texts(texts):
+    """UTF-8 encodes strings into one uint8 blob plus an (n + 1) int64 offsets array."""
+    encoded = [(text if isinstance(text, str) else "").encode("utf-8") for text in texts]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+def _replace_file(path, write):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+def _remove_old_versions(directory, keep, retain=2):
+    """Deletes all but the newest `retain` superseded versions; a reader that read meta.json just
+    before the switch may still be opening one of those."""
+    versions = sorted(name for name in os.listdir(directory) if name.startswith("v-") and name != keep)
+    for name in versions[:-retain] if retain else versions:
+        # Files still memory-mapped by a running API can't be deleted on Windows; retried on the next save
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+
+class Catalog:
+    """Book ids, label score matrix and text columns of the classified catalog."""
+
+    def __init__(self, book_ids, score_matrix, labels, texts):
+        self.book_ids = book_ids
+        self.score_matrix = score_matrix
+        self.labels = labels
+        self.label_index = {label: col for col, label in enumerate(labels)}
+        self.texts = texts  # column -> (offsets, blob)
+        self._ids = IdLookup(book_ids)
+
+    @classmethod
+    def from_frame(cls, df):
+        """Builds a catalog from the classified DataFrame (as read from classified_books.json)."""
+        if 'book_id' not in df.columns:
+            df = df.assign(book_id=range(len(df)))
+        score_matrix, label_index = build_label_score_matrix(df)
+        texts = {column: _pack_texts(df[column] if column in df.columns else [""] * len(df)) for column in TEXT_COLUMNS}
+        return cls(df['book_id'].to_numpy(dtype=np.int64), score_matrix, list(label_index), texts)
+
+    @classmethod
+    def from_json(cls, path):
+        return cls.from_frame(pd.read_json(path))
+
+    def save(self, directory):
+        """Writes the arrays into a new version subdirectory, then atomically replaces meta.json,
+        which names the current version.
+
+        Published versions are never modified, so a reader that reads meta.json gets one
+        complete set of files even while a newer catalog is being written. An API that has a
+        previous version memory-mapped keeps reading it; the oldest versions are removed.
+        """
+        os.makedirs(directory, exist_ok=True)
+        version = f"v-{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+        version_dir = os.path.join(directory, version)
+        os.makedirs(version_dir)
+        arrays = {"book_ids.npy": self.book_ids, "score_matrix.npy": np.ascontiguousarray(self.score_matrix, dtype=np.float32)}
+        for column, (offsets, blob) in self.texts.items():
+            arrays[f"{column}_offsets.npy"], arrays[f"{column}_bytes.npy"] = offsets, blob
+        for name, array in arrays.items():
+            np.save(os.path.join(version_dir, name), array)
+        meta = {"version": version, "labels": self.labels, "text_columns": list(self.texts), "n_books": len(self.book_ids)}
+        _replace_file(os.path.join(directory, "meta.json"), lambda f: f.write(json.dumps(meta).encode("utf-8")))
+        _remove_old_versions(directory, keep=version)
+
+    @classmethod
+    def load(cls, directory):
+        """Memory-maps the current catalog version; text is only decoded when a row is accessed."""
+        with open(os.path.join(directory, "meta.json"), 'r') as f:
+            meta = json.load(f)
+        # Catalogs saved before versioning keep their arrays next to meta.json
+        version_dir = os.path.join(directory, meta["version"]) if "version" in meta else directory
+        load = lambda name: np.load(os.path.join(version_dir, name), mmap_mode='r')
+        texts = {column: (load(f"{column}_offsets.npy"), load(f"{column}_bytes.npy")) for column in meta["text_columns"]}
+        book_ids, score_matrix = np.asarray(load("book_ids.npy")), load("score_matrix.npy")
+        n_books = meta["n_books"]
+        consistent = (len(book_ids) == n_books and score_matrix.shape == (n_books, len(meta["labels"]))
+                      and all(len(offsets) == n_books + 1 and offsets[-1] == len(blob) for offsets, blob in texts.values()))
+        if not consistent:
+            raise ValueError(f"Catalog at {version_dir} does not match its meta.json.")
+        return cls(book_ids, score_matrix, meta["labels"], texts)
+
+    def __len__(self):
+        return len(self.book_ids)
+
+    def row(self, book_id):
+        return self._ids.position(book_id)
+
+    def text(self, column, row):
+        offsets, blob = self.texts[column]
+        return bytes(blob[offsets[row]:offsets[row + 1]]).decode("utf-8")
+
+    def content(self, book_id):
+        return self.text("content", self.row(book_id))
+
+    def frame(self):
+        """book_id-indexed DataFrame of catalog row positions.
+
+        No text is decoded here: callers select the few books they return and read their
+        display columns with `text(column, row)`, straight from the memory-mapped blobs.
+        """
+        return pd.DataFrame({'row': np.arange(len(self), dtype=np.int64)}, index=pd.Index(self.book_ids, name='book_id'))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert classified_books.json into the memory-mapped catalog format.")
+    parser.add_argument("--input", default=config.CLASSIFIED_BOOKS_PATH)
+    parser.add_argument("--output", default=config.CATALOG_DIR)
+    args = parser.parse_args()
+
+    catalog = Catalog.from_json(args.input)
+    catalog.save(args.output)
+    logger.info(f"Saved catalog of {len(catalog)} books and {len(catalog.labels)} labels to {args.output}")
@@ -6,15 +6,87 @@ DATA_DIR = os.path.join(PROJECT_ROOT, "data")
 
 
 CLASSIFIED_BOOKS_PATH = os.path.join(DATA_DIR, "classified_books.json")
+# Memory-mapped columnar form of CLASSIFIED_BOOKS_PATH, built with `python -m api.catalog`
+CATALOG_DIR = os.path.join(DATA_DIR, "catalog")
+# Poll the catalog source every N seconds and hot-reload it when republished (None = only via
+# POST /admin/catalog/reload, which needs the X-Admin-Token header to match ADMIN_TOKEN)
+CATALOG_WATCH_INTERVAL_SECONDS = None
+ADMIN_TOKEN = os.environ.get("BOOKWISE_ADMIN_TOKEN")
 BEST_PARAMS_PATH = os.path.join(DATA_DIR, "best_summary_params.json")
+SEMANTIC_INDEX_DIR = os.path.join(DATA_DIR, "semantic_index")
+SUMMARY_CACHE_PATH = os.environ.get("BOOKWISE_SUMMARY_CACHE_PATH", os.path.join(DATA_DIR, "summary_cache.sqlite3"))
+PRESUMMARIZED_PATH = os.path.join(DATA_DIR, "presummarized_books.parquet")
+ONNX_MODEL_DIR = os.path.join(DATA_DIR, "onnx_summarizer")
 
 
 SUMMARIZATION_MODEL = "google/pegasus-large"
+# Inference backend: "torch" (fp32), "torch-int8" (dynamic quantization) or "onnx" (ONNX Runtime,
+# needs `pip install -r requirements-parity.txt`); check a backend with `python -m api.backend_parity`
+SUMMARIZATION_BACKEND = "torch"
+# "truncate" summarizes the first 1024 tokens; "hierarchical" summarizes overlapping windows of the
+# whole document in batches, then summarizes their concatenation
+SUMMARIZATION_MODE = "truncate"
+SUMMARY_CHUNK_OVERLAP = 128
+SUMMARY_CHUNK_BATCH_SIZE = 16
+# Optional small seq2seq draft model sharing pegasus' tokenizer (e.g. "sshleifer/distill-pegasus-xsum-16-4")
+# for speculative (assisted) decoding; None disables it. Assisted generation runs one document at a
+# time. Tune it with `num_assistant_tokens` / `num_assistant_tokens_schedule` in best_summary_params.json.
+SUMMARIZATION_DRAFT_MODEL = None
+
+
+# Per-book cache of tokenized inputs + encoder hidden states, shared by the three reading-time
+# variants (torch backends, "truncate" mode); ~4 MB per book for pegasus-large
+ENCODER_CACHE_MAX_MB = 512
+ENCODER_CACHE_MAX_ENTRIES = 1024
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+# Persistent /summary cache size, and an optional fixed sampling seed (None = unpinned). With a
+# pinned seed and do_sample, each summary is generated alone (batch size 1) so it stays reproducible.
+SUMMARY_CACHE_MAX_ENTRIES = 10000
+SUMMARY_SEED = None
+
+
+# /summary micro-batching: max requests per generate call and how long to wait to fill a batch
+SUMMARY_MAX_BATCH_SIZE = 8
+SUMMARY_MAX_WAIT_MS = 10
+# Only documents with the same summary length bounds share a generate call, so target lengths
+# are bucketed to multiples of this many tokens: min_len may be up to 0.7x and max_len up to
+# 1.3x this below/above the exact target (0 = exact bounds, which rarely batch)
+SUMMARY_LENGTH_BUCKET = 32
+
+
+# Dedicated inference workers: thread count, torch intra-op threads per worker (None = torch default),
+# and how many summary requests may wait before new ones are rejected with 429
+INFERENCE_WORKERS = 1
+INFERENCE_TORCH_THREADS = None
+INFERENCE_QUEUE_SIZE = 64
+
+
+# Retry-After sent with /summary 503s while the model is still loading in the background
+SUMMARIZER_RETRY_AFTER_SECONDS = 30
+
+
+# IVF lists scanned per semantic query (higher = better recall, slower)
+SEMANTIC_INDEX_NPROBE = 8
 
 
 N_RECOMMENDATIONS = 7
 
 
+READING_TIME_RATIOS = {'5 minutes': 0.3, '10 minutes': 0.5, '15+ minutes': 0.7}
+
+
+# Max distinct preference label sets kept in the /recommendations/for-you result cache
+FOR_YOU_CACHE_SIZE = 1024
+
+# Max float32 scores (users x books) held per matrix-matrix product in /recommendations/for-you/batch;
+# 4M elements = 16 MB per request, i.e. 40 users per product at 100k books and 4 at 1M
+BATCH_SCORING_MAX_ELEMENTS = 4_000_000
+# Max users per /recommendations/for-you/batch request; larger bodies are rejected with 422
+FOR_YOU_BATCH_MAX_USERS = 1024
+
+
 TOP_RATED_CATEGORIES = [
     "Personal Development", "Career Success", "Productivity Enhancement",
     "Happiness and Well-Being", "Finance and Investment", "Leadership",
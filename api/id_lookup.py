@@ -0,0 +1,16 @@
+import numpy as np
+
+
+class IdLookup:
+    """book_id -> row position through a sorted copy of the ids, without a per-book Python dict."""
+
+    def __init__(self, book_ids):
+        self._order = np.argsort(book_ids, kind='stable')
+        self._sorted_ids = book_ids[self._order]
+
+    def position(self, book_id):
+        """Row of `book_id` in the original array; KeyError if it is not there."""
+        pos = np.searchsorted(self._sorted_ids, book_id)
+        if pos >= len(self._sorted_ids) or self._sorted_ids[pos] != book_id:
+            raise KeyError(book_id)
+        return int(self._order[pos])
@@ -0,0 +1,144 @@
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceQueueFull(Exception):
+    """Raised when the admission queue is full; callers should shed load (429)."""
+
+
+class InferencePool:
+    """Dedicated inference workers in front of the summarization model.
+
+    Requests are admitted into a bounded queue, so expensive generation never occupies the web
+    server's threadpool and overload is rejected instead of piling up. Each worker thread
+    collects summary requests for up to `max_wait_ms` (or until `max_batch_size` are waiting)
+    and runs one `summarize_batch` call per reading-time ratio, which batches the requests whose
+    target summary lengths match; streaming jobs run alone.
+    """
+
+    def __init__(self, summarizer, params, num_workers=1, torch_threads=None,
+                 max_queue_size=64, max_batch_size=8, max_wait_ms=10):
+        self.summarizer = summarizer
+        self.params = params
+        self.torch_threads = torch_threads
+        self.max_queue_size = max_queue_size
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._workers = [
+            threading.Thread(target=self._run, name=f"inference-worker-{i}", daemon=True)
+            for i in range(num_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def _admit(self, job):
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            raise InferenceQueueFull(f"Inference queue is full ({self.max_queue_size} waiting).")
+        return job[-1]
+
+    def submit_summary(self, text, ratio, cache_key=None):
+        """`cache_key` (e.g. the book id) lets the summarizer reuse that text's encoder outputs."""
+        return self._admit(("summary", text, ratio, cache_key, Future()))
+
+    def submit_stream(self, text, ratio, streamer, cache_key=None):
+        """Queues a streaming generation; decoded text is pushed into `streamer` as it is produced."""
+        return self._admit(("stream", text, ratio, cache_key, streamer, Future()))
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        with self._lock:
+            return {"queue_depth": self.queue_depth, "max_queue_size": self.max_queue_size,
+                    "in_flight": self.in_flight, "workers": len(self._workers), "completed": self.completed,
+                    "failed": self.failed, "rejected": self.rejected}
+
+    def _collect(self):
+        """Blocks for the first job, then gathers summary jobs until the batch is full or max_wait passes."""
+        first = self._queue.get()
+        if first[0] == "stream":
+            return [], [first]
+        summaries, streams = [first], []
+        deadline = time.monotonic() + self.max_wait
+        while len(summaries) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                job = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            (streams if job[0] == "stream" else summaries).append(job)
+        return summaries, streams
+
+    def _run(self):
+        if self.torch_threads:
+            import torch
+            # Bounds this worker's intra-op threads so parallel workers don't oversubscribe the CPU
+            torch.set_num_threads(self.torch_threads)
+        while True:
+            summaries, streams = self._collect()
+            by_ratio = {}
+            for _, text, ratio, cache_key, future in summaries:
+                if future.set_running_or_notify_cancel():
+                    by_ratio.setdefault(ratio, []).append((text, cache_key, future))
+            for ratio, items in by_ratio.items():
+                self._track(len(items), lambda: self._run_batch(ratio, items))
+            for _, text, ratio, cache_key, streamer, future in streams:
+                if future.set_running_or_notify_cancel():
+                    self._track(1, lambda: self._run_stream(text, ratio, cache_key, streamer, future))
+
+    def _track(self, n, work):
+        with self._lock:
+            self.in_flight += n
+        try:
+            ok = work()
+        finally:
+            with self._lock:
+                self.in_flight -= n
+        with self._lock:
+            if ok:
+                self.completed += n
+            else:
+                self.failed += n
+
+    def _run_batch(self, ratio, items):
+        try:
+            summaries = self.summarizer.summarize_batch(
+                [text for text, _, _ in items], self.params, ratio=ratio, cache_keys=[key for _, key, _ in items]
+            )
+        except Exception as e:
+            logger.error(f"Batched summarization of {len(items)} requests failed: {e}")
+            for _, _, future in items:
+                future.set_exception(e)
+            return False
+        for (_, _, future), summary in zip(items, summaries):
+            future.set_result(summary)
+        return True
+
+    def _run_stream(self, text, ratio, cache_key, streamer, future):
+        try:
+            self.summarizer.generate_streaming(text, self.params, streamer, ratio=ratio, cache_key=cache_key)
+        except Exception as e:
+            logger.error(f"Streamed summarization failed: {e}")
+            streamer.end()
+            future.set_exception(e)
+            return False
+        future.set_result(None)
+        return True
@@ -0,0 +1,18 @@
+import os
+import json
+
+
+def read_jsonl(path):
+    """Yields the records of an append-only JSONL file; a missing file yields nothing.
+
+    A line that does not parse is skipped: it is the torn last line of an interrupted run,
+    whose work is simply redone.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
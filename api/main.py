@@ -1,90 +1,354 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response, Header, Body
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
-import pandas as pd
+import os
 import json
+import time
+import hmac
+import asyncio
+import threading
+import hashlib
 import logging
 from typing import List
-import traceback
 
 from . import config
-from .summarization_model_handler import SummarizationModelHandler
+from .summarization_model_handler import SummarizationModelHandler, AsyncTextStreamer
 from . import recommendation_logic
+from .result_cache import LRUCache
+from .catalog import Catalog
+from .semantic_index import IVFIndex
+from .summary_cache import SummaryCache
+from .presummarize import load_store
+from .inference_pool import InferencePool, InferenceQueueFull
+from . import metrics
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 app = FastAPI(title="BookWise API v2.0 - Final Version")
-state = {}
+app.add_middleware(metrics.RequestMetricsMiddleware)
+state = {'components': {'catalog': 'loading', 'params': 'loading', 'semantic_index': 'loading', 'summarizer': 'loading'}}
+_reload_lock = threading.Lock()
+metrics.REGISTRY.register(metrics.StateCollector(state))
+
+def _books_response(catalog, books_df):
+    # Display text is decoded from the memory-mapped catalog for the returned rows only
+    if books_df.empty:
+        return []
+    with metrics.SERIALIZATION.time():
+        return [{"book_id": int(i), "title": catalog.text('title', row), "cover_url": catalog.text('cover_url', row)}
+                for i, row in zip(books_df.index, books_df['row'])]
+
+def _catalog_source():
+    meta_path = os.path.join(config.CATALOG_DIR, "meta.json")
+    return meta_path if os.path.exists(meta_path) else config.CLASSIFIED_BOOKS_PATH
+
+def build_catalog_snapshot():
+    """Loads the classified catalog and everything derived from it (score matrix, top-rated payload, result cache)."""
+    source = _catalog_source()
+    source_mtime = os.path.getmtime(source)
+    if os.path.isdir(config.CATALOG_DIR):
+        catalog = Catalog.load(config.CATALOG_DIR)
+    else:
+        logger.warning(f"No catalog at {config.CATALOG_DIR}; parsing {config.CLASSIFIED_BOOKS_PATH} (run `python -m api.catalog` to convert it).")
+        catalog = Catalog.from_json(config.CLASSIFIED_BOOKS_PATH)
+    # All text stays in the (memory-mapped) catalog; the DataFrame only maps book ids to rows
+    df = catalog.frame()
+
+    # The top-rated list only depends on the catalog, so it is served as pre-serialized bytes
+    top_rated_df = recommendation_logic.get_top_rated_books(df, catalog.score_matrix, catalog.label_index)
+    payload = json.dumps(_books_response(catalog, top_rated_df)).encode('utf-8')
+    return {
+        'catalog': catalog, 'df': df, 'score_matrix': catalog.score_matrix, 'label_index': catalog.label_index,
+        'top_rated': (payload, f'"{hashlib.sha256(payload).hexdigest()[:32]}"'),
+        'for_you_cache': LRUCache(config.FOR_YOU_CACHE_SIZE),
+        'source': source, 'source_mtime': source_mtime, 'loaded_at': time.time(),
+    }
+
+def load_catalog():
+    # Endpoints read state['snapshot'] once per request, so swapping this single reference is
+    # atomic: in-flight requests finish on the old snapshot, which is freed (and its files
+    # unmapped) when the last of them drops it.
+    state['snapshot'] = build_catalog_snapshot()
+
+def reload_catalog():
+    """Rebuilds the catalog snapshot and swaps it in; returns False if a reload is already running."""
+    if not _reload_lock.acquire(blocking=False):
+        return False
+    try:
+        state['catalog_reload'] = {'status': 'reloading'}
+        load_catalog()
+        state['catalog_reload'] = {'status': 'idle'}
+        logger.info(f"Catalog reloaded ({len(state['snapshot']['catalog'])} books).")
+    except Exception as e:
+        # The previous snapshot keeps serving
+        logger.error(f"Catalog reload failed: {e}")
+        state['catalog_reload'] = {'status': 'failed', 'error': str(e)}
+    finally:
+        _reload_lock.release()
+    return True
+
+def _watch_catalog(interval):
+    """Reloads the catalog whenever its source file is republished."""
+    last_seen = state['snapshot']['source_mtime']
+    while True:
+        time.sleep(interval)
+        try:
+            mtime = os.path.getmtime(_catalog_source())
+        except OSError:
+            continue
+        if mtime != last_seen:
+            last_seen = mtime
+            logger.info("Catalog source changed on disk; reloading.")
+            reload_catalog()
 
 @app.on_event("startup")
 def load_all():
     logger.info("API Server starting up...")
-    df = pd.read_json(config.CLASSIFIED_BOOKS_PATH)
-    if 'book_id' not in df.columns:
-        df['book_id'] = range(len(df))
-    df.set_index('book_id', inplace=True)
-    state['df_classified'] = df
+    components = state['components']
+    load_catalog()
+    state['catalog_reload'] = {'status': 'idle'}
+    components['catalog'] = 'ready'
+    if config.CATALOG_WATCH_INTERVAL_SECONDS:
+        threading.Thread(target=_watch_catalog, args=(config.CATALOG_WATCH_INTERVAL_SECONDS,), name="catalog-watcher", daemon=True).start()
     
+    if os.path.isdir(config.SEMANTIC_INDEX_DIR):
+        state['semantic_index'] = IVFIndex.load(config.SEMANTIC_INDEX_DIR, nprobe=config.SEMANTIC_INDEX_NPROBE)
+        components['semantic_index'] = 'ready'
+    else:
+        logger.warning(f"No semantic index at {config.SEMANTIC_INDEX_DIR}; run `python -m api.semantic_index` to build it.")
+        components['semantic_index'] = 'missing'
+
     with open(config.BEST_PARAMS_PATH, 'r') as f:
         state['best_summary_params'] = json.load(f)
         
-    state['summarizer'] = SummarizationModelHandler()
-    logger.info("Startup complete.")
+    state['presummarized'] = load_store(config.PRESUMMARIZED_PATH)
+    logger.info(f"Loaded {len(state['presummarized'])} precomputed summaries.")
+    state['summary_cache'] = SummaryCache(config.SUMMARY_CACHE_PATH, config.SUMMARY_CACHE_MAX_ENTRIES)
+    components['params'] = 'ready'
+
+    # The summarization model takes a long time to download and load; recommendations serve meanwhile
+    threading.Thread(target=load_summarizer, name="summarizer-loader", daemon=True).start()
+    logger.info("Startup complete; summarizer loading in the background.")
+
+def load_summarizer():
+    summarizer = SummarizationModelHandler()
+    if summarizer.model is None:
+        state['components']['summarizer'] = 'failed'
+        return
+    state['summarizer'] = summarizer
+    state['inference_pool'] = InferencePool(
+        summarizer, state['best_summary_params'],
+        num_workers=config.INFERENCE_WORKERS, torch_threads=config.INFERENCE_TORCH_THREADS,
+        max_queue_size=config.INFERENCE_QUEUE_SIZE,
+        max_batch_size=config.SUMMARY_MAX_BATCH_SIZE, max_wait_ms=config.SUMMARY_MAX_WAIT_MS
+    )
+    state['components']['summarizer'] = 'ready'
+    logger.info("Summarizer ready.")
 
 
 class UserPreferences(BaseModel):
     goals: List[str] = []; skills: List[str] = []; content_types: List[str] = []; habit_building: bool = False
 
+class SemanticSearchRequest(BaseModel):
+    query: str = Field(..., min_length=1)
+
 class SummarizationRequest(BaseModel):
     book_id: int
     reading_time: str = Field(..., pattern=r"^(5 minutes|10 minutes|15\+ minutes)$")
 
 # --- Final API Endpoints ---
 
+def _snapshot():
+    snapshot = state.get('snapshot')
+    if snapshot is None or not len(snapshot['catalog']): raise HTTPException(503, "Service not ready.")
+    return snapshot
+
 @app.get("/recommendations/top-rated", summary="Get top 7 general book recommendations")
-def get_top_rated_endpoint():
-    df = state.get('df_classified')
-    if df is None or df.empty: raise HTTPException(503, "Service not ready.")
-    top_rated_df = recommendation_logic.get_top_rated_books(df.copy())
-    response = [{"book_id": int(i), "title": r['title'], "cover_url": r.get('cover_url', '')} for i, r in top_rated_df.iterrows()]
-    return response
+def get_top_rated_endpoint(request: Request):
+    payload, etag = _snapshot()['top_rated']
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(content=payload, media_type="application/json", headers={"ETag": etag})
 
 @app.post("/recommendations/for-you", summary="Get 7 personalized recommendations for the user")
 def get_for_you_endpoint(preferences: UserPreferences):
-    df = state.get('df_classified')
-    if df is None or df.empty: raise HTTPException(503, "Service not ready.")
-    recommended_df = recommendation_logic.get_for_you_recommendations(df.copy(), preferences.dict())
-    response = [{"book_id": int(i), "title": r['title'], "cover_url": r.get('cover_url', '')} for i, r in recommended_df.iterrows()]
-    return response
+    snapshot = _snapshot()
+    with metrics.SCORING.time():
+        recommended_df = recommendation_logic.get_for_you_recommendations(
+            snapshot['df'], snapshot['score_matrix'], snapshot['label_index'], preferences.dict(), cache=snapshot['for_you_cache']
+        )
+    return _books_response(snapshot['catalog'], recommended_df)
 
-@app.post("/summary", summary="Get an on-demand summary for a single book")
-def get_summary_endpoint(request: SummarizationRequest):
-    df = state.get('df_classified')
-    summarizer = state.get('summarizer')
-    best_params = state.get('best_summary_params')
+@app.post("/recommendations/for-you/batch", summary="Get personalized recommendations for many users in one call")
+def get_for_you_batch_endpoint(preferences_list: List[UserPreferences] = Body(..., max_length=config.FOR_YOU_BATCH_MAX_USERS)):
+    snapshot = _snapshot()
+    with metrics.SCORING.time():
+        recommended_dfs = recommendation_logic.get_for_you_batch(
+            snapshot['df'], snapshot['score_matrix'], snapshot['label_index'], [p.dict() for p in preferences_list],
+            cache=snapshot['for_you_cache']
+        )
+    return [_books_response(snapshot['catalog'], recommended_df) for recommended_df in recommended_dfs]
 
-    if df is None or summarizer is None:
-        raise HTTPException(503, "Service not ready.")
+def _semantic_response(snapshot, book_ids):
+    df = snapshot['df']
+    book_ids = [int(i) for i in book_ids if i in df.index]
+    return _books_response(snapshot['catalog'], df.loc[book_ids])
 
+@app.get("/recommendations/similar/{book_id}", summary="Get books semantically similar to a book")
+def get_similar_endpoint(book_id: int):
+    snapshot = state.get('snapshot')
+    index = state.get('semantic_index')
+    if snapshot is None or index is None: raise HTTPException(503, "Semantic index not available.")
     try:
-        content = df.loc[request.book_id, 'content']
+        book_ids, _ = index.similar_to(book_id, config.N_RECOMMENDATIONS)
     except KeyError:
         raise HTTPException(404, "Book ID not found.")
+    return _semantic_response(snapshot, book_ids)
+
+@app.post("/recommendations/search", summary="Get books matching a free-text query")
+def get_search_endpoint(request: SemanticSearchRequest):
+    snapshot = state.get('snapshot')
+    index = state.get('semantic_index')
+    if snapshot is None or index is None: raise HTTPException(503, "Semantic index not available.")
+    book_ids, _ = index.search_text(request.query, config.N_RECOMMENDATIONS)
+    return _semantic_response(snapshot, book_ids)
+
+def _summary_cache_key(content, ratio, params):
+    return SummaryCache.make_key(content, ratio, params)
+
+def _cached_summary(cache_key):
+    # Precomputed summaries from `python -m api.presummarize` first, then the on-demand cache
+    summary = state.get('presummarized', {}).get(cache_key)
+    if summary is not None:
+        metrics.SUMMARY_SOURCE.labels("presummarized").inc()
+        return summary
+    summary = state['summary_cache'].get(cache_key)
+    if summary is not None:
+        metrics.SUMMARY_SOURCE.labels("cache").inc()
+    return summary
+
+def _summary_inputs(request: SummarizationRequest):
+    snapshot = state.get('snapshot')
+    if snapshot is None or 'summary_cache' not in state:
+        raise HTTPException(503, "Service not ready.")
 
     try:
-        reading_time_map = {'5 minutes': 0.3, '10 minutes': 0.5, '15+ minutes': 0.7}
-        ratio = reading_time_map.get(request.reading_time)
-        
-        summary = summarizer.summarize_text(content, params=best_params, ratio=ratio)
-        
-        if "Error" in summary:
-            print(f"--- Summarizer Function Returned an Error: {summary} ---")
-            raise HTTPException(500, "Failed to generate summary.")
-            
+        content = snapshot['catalog'].content(request.book_id)
+    except KeyError:
+        raise HTTPException(404, "Book ID not found.")
+
+    ratio = config.READING_TIME_RATIOS.get(request.reading_time)
+    return content, ratio, _summary_cache_key(content, ratio, state['best_summary_params'])
+
+def _inference_pool():
+    # Cached summaries are served before this check, so they work while the model is still loading
+    status = state['components']['summarizer']
+    if status == 'failed':
+        raise HTTPException(503, "Summarizer failed to load.")
+    if status != 'ready':
+        raise HTTPException(503, "Summarizer is still loading.", headers={"Retry-After": str(config.SUMMARIZER_RETRY_AFTER_SECONDS)})
+    return state['inference_pool']
+
+def _queue_full():
+    return HTTPException(429, "Summarization queue is full, please retry shortly.", headers={"Retry-After": "1"})
+
+@app.post("/summary", summary="Get an on-demand summary for a single book")
+async def get_summary_endpoint(request: SummarizationRequest):
+    content, ratio, cache_key = _summary_inputs(request)
+
+    summary = await run_in_threadpool(_cached_summary, cache_key)
+    if summary is not None:
         return {"book_id": request.book_id, "summary": summary}
 
-    except Exception as e:
-        
-        print("--- UNEXPECTED ERROR TRACEBACK ---")
-        print(traceback.format_exc())
-        print("----------------------------------")
+    # Generation runs on the inference pool, so this request holds no web-server thread while it waits
+    metrics.SUMMARY_SOURCE.labels("generated").inc()
+    try:
+        future = _inference_pool().submit_summary(content, ratio, cache_key=request.book_id)
+    except InferenceQueueFull:
+        raise _queue_full()
+
+    try:
+        summary = await asyncio.wrap_future(future)
+    except Exception:
+        logger.exception(f"Summary failed for book {request.book_id}")
         raise HTTPException(500, detail="Failed to generate summary due to an internal error.")
+
+    await run_in_threadpool(state['summary_cache'].put, cache_key, summary)
+    return {"book_id": request.book_id, "summary": summary}
+
+@app.post("/summary/stream", summary="Stream an on-demand summary as server-sent events")
+async def get_summary_stream_endpoint(request: SummarizationRequest):
+    content, ratio, cache_key = _summary_inputs(request)
+    summary_cache = state['summary_cache']
+
+    cached = await run_in_threadpool(_cached_summary, cache_key)
+    streamer, future = None, None
+    if cached is None:
+        pool = _inference_pool()
+        metrics.SUMMARY_SOURCE.labels("generated").inc()
+        streamer = AsyncTextStreamer(state['summarizer'].tokenizer, asyncio.get_running_loop())
+        try:
+            future = pool.submit_stream(content, ratio, streamer, cache_key=request.book_id)
+        except InferenceQueueFull:
+            raise _queue_full()
+
+    async def events():
+        try:
+            if cached is not None:
+                yield f"data: {json.dumps({'text': cached})}\n\n"
+            else:
+                pieces = []
+                async for piece in streamer:
+                    pieces.append(piece)
+                    yield f"data: {json.dumps({'text': piece})}\n\n"
+                await asyncio.wrap_future(future)
+                await run_in_threadpool(summary_cache.put, cache_key, "".join(pieces).strip())
+            yield f"event: done\ndata: {json.dumps({'book_id': request.book_id})}\n\n"
+        except Exception:
+            logger.exception(f"Streamed summary failed for book {request.book_id}")
+            yield f"event: error\ndata: {json.dumps({'detail': 'Failed to generate summary.'})}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.get("/ready", summary="Per-component readiness")
+def get_ready_endpoint(response: Response):
+    # Ready to take traffic once the catalog is served; the summarizer may still be loading
+    components = dict(state['components'])
+    ready = components['catalog'] == 'ready' and components['params'] == 'ready'
+    response.status_code = 200 if ready else 503
+    return {"ready": ready, "components": components}
+
+@app.get("/metrics", summary="Prometheus metrics", include_in_schema=False)
+def get_metrics_endpoint():
+    payload, content_type = metrics.render()
+    return Response(content=payload, media_type=content_type)
+
+@app.get("/inference/stats", summary="Inference queue depth and worker counters")
+def get_inference_stats_endpoint():
+    pool = state.get('inference_pool')
+    if pool is None: raise HTTPException(503, "Service not ready.")
+    stats = pool.stats()
+    summarizer = state['summarizer']
+    if summarizer.encoder_cache is not None:
+        stats['encoder_cache'] = summarizer.encoder_cache.stats()
+    speculative = summarizer.speculative_stats()
+    if speculative is not None:
+        stats['speculative'] = speculative
+    return stats
+
+@app.post("/admin/catalog/reload", status_code=202, summary="Reload the classified catalog in the background")
+def reload_catalog_endpoint(x_admin_token: str = Header(None)):
+    # Disabled unless an admin token is configured
+    if not config.ADMIN_TOKEN or not hmac.compare_digest(x_admin_token or "", config.ADMIN_TOKEN):
+        raise HTTPException(403, "Forbidden.")
+    if state['catalog_reload'].get('status') == 'reloading':
+        raise HTTPException(409, "A catalog reload is already running.")
+    threading.Thread(target=reload_catalog, name="catalog-reload", daemon=True).start()
+    return {"status": "reloading"}
+
+@app.get("/admin/catalog", summary="Currently served catalog snapshot and reload status")
+def get_catalog_status_endpoint():
+    snapshot = _snapshot()
+    return {"books": len(snapshot['catalog']), "source": snapshot['source'], "loaded_at": snapshot['loaded_at'],
+            "reload": state['catalog_reload']}
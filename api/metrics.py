@@ -0,0 +1,137 @@
+"""Prometheus metrics for the API.
+
+Latencies are histograms observed inline, a bucket increment each. Counters that the
+components already keep (result caches, summary cache, inference queue, speculative
+decoding) are not duplicated on the hot path: `StateCollector` reads them at scrape time.
+"""
+import time
+
+from prometheus_client import CollectorRegistry, Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+REGISTRY = CollectorRegistry()
+
+REQUEST_SECONDS = Histogram(
+    "bookwise_request_duration_seconds", "HTTP request latency by route (streams: until the response starts).",
+    ["method", "endpoint", "status"], registry=REGISTRY,
+)
+REQUEST_ERRORS = Counter(
+    "bookwise_request_errors_total", "Requests that ended in a 5xx or an unhandled exception.",
+    ["method", "endpoint"], registry=REGISTRY,
+)
+STAGE_SECONDS = Histogram(
+    "bookwise_stage_duration_seconds", "Latency of internal request stages.",
+    ["stage"], registry=REGISTRY,
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+SUMMARY_INPUT_TOKENS = Counter("bookwise_summary_input_tokens_total", "Tokens fed to the summarizer's encoder.", registry=REGISTRY)
+SUMMARY_OUTPUT_TOKENS = Counter("bookwise_summary_generated_tokens_total", "Tokens generated by the summarizer.", registry=REGISTRY)
+SUMMARY_SOURCE = Counter(
+    "bookwise_summary_requests_total", "Summary requests by where the summary came from.",
+    ["source"], registry=REGISTRY,
+)
+
+# Label children bound once, so the hot path skips the labels() lookup
+SCORING = STAGE_SECONDS.labels(stage="scoring")
+SERIALIZATION = STAGE_SECONDS.labels(stage="serialization")
+TOKENIZATION = STAGE_SECONDS.labels(stage="tokenization")
+ENCODE = STAGE_SECONDS.labels(stage="encode")
+GENERATE = STAGE_SECONDS.labels(stage="generate")
+DECODE = STAGE_SECONDS.labels(stage="decode")
+
+
+class StateCollector:
+    """Exports the counters the app's components already maintain, read from `state` per scrape."""
+
+    def __init__(self, state):
+        self.state = state
+
+    def collect(self):
+        state = self.state
+        caches = GaugeMetricFamily("bookwise_cache_entries", "Entries held per cache.", labels=["cache"])
+        lookups = CounterMetricFamily("bookwise_cache_lookups", "Cache lookups by result.", labels=["cache", "result"])
+        evictions = CounterMetricFamily("bookwise_cache_evictions", "Cache evictions.", labels=["cache"])
+
+        named = []
+        snapshot = state.get('snapshot')
+        if snapshot is not None:
+            named.append(("for_you", snapshot['for_you_cache'].stats()))
+        summarizer = state.get('summarizer')
+        if summarizer is not None and summarizer.encoder_cache is not None:
+            named.append(("encoder", summarizer.encoder_cache.stats()))
+        if 'summary_cache' in state:
+            summary_cache = state['summary_cache']
+            named.append(("summary", {"hits": summary_cache.hits, "misses": summary_cache.misses}))
+        for name, stats in named:
+            if "entries" in stats:
+                caches.add_metric([name], stats["entries"])
+            lookups.add_metric([name, "hit"], stats["hits"])
+            lookups.add_metric([name, "miss"], stats["misses"])
+            if "evictions" in stats:
+                evictions.add_metric([name], stats["evictions"])
+        yield caches
+        yield lookups
+        yield evictions
+
+        pool = state.get('inference_pool')
+        if pool is not None:
+            stats = pool.stats()
+            yield GaugeMetricFamily("bookwise_inference_queue_depth", "Summary jobs waiting for a worker.", value=stats["queue_depth"])
+            yield GaugeMetricFamily("bookwise_inference_in_flight", "Summary jobs being generated.", value=stats["in_flight"])
+            jobs = CounterMetricFamily("bookwise_inference_jobs", "Inference jobs by outcome.", labels=["outcome"])
+            for outcome in ("completed", "failed", "rejected"):
+                jobs.add_metric([outcome], stats[outcome])
+            yield jobs
+
+        speculative = summarizer.speculative_stats() if summarizer is not None else None
+        if speculative is not None:
+            yield CounterMetricFamily("bookwise_speculative_draft_tokens", "Draft tokens proposed.", value=speculative["draft_tokens"])
+            yield CounterMetricFamily("bookwise_speculative_accepted_tokens", "Draft tokens accepted.", value=speculative["accepted_draft_tokens"])
+
+
+def observe_request(method, endpoint, status, started):
+    REQUEST_SECONDS.labels(method, endpoint, str(status)).observe(time.perf_counter() - started)
+    if status >= 500:
+        REQUEST_ERRORS.labels(method, endpoint).inc()
+
+
+class RequestMetricsMiddleware:
+    """Pure ASGI middleware timing each HTTP request until its response starts.
+
+    Unlike `@app.middleware("http")` it adds no request/response wrapping or extra task,
+    just a `send` hook. The endpoint label is the matched route template (e.g.
+    /recommendations/similar/{book_id}), which the router stores in the shared scope.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        responded = False
+
+        async def send_and_observe(message):
+            nonlocal responded
+            if message['type'] == 'http.response.start':
+                responded = True
+                observe_request(scope['method'], _endpoint(scope), message['status'], started)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_observe)
+        except Exception:
+            if not responded:
+                observe_request(scope['method'], _endpoint(scope), 500, started)
+            raise
+
+
+def _endpoint(scope):
+    # Route templates keep label cardinality bounded
+    route = scope.get('route')
+    return route.path if route is not None else "unmatched"
+
+
+def render():
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
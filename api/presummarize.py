@@ -0,0 +1,145 @@
+"""Offline bulk pre-summarization of the whole catalog.
+
+Generates every reading-time summary for every book in padded batches across worker
+processes, checkpointing each finished batch so an interrupted run resumes where it
+stopped, then writes a Parquet file the API serves directly.
+
+    python -m api.presummarize --workers 4 --torch-threads 2 --batch-size 8
+"""
+import os
+import sys
+import json
+import argparse
+import logging
+import multiprocessing as mp
+
+import pandas as pd
+
+from . import config
+from .summary_cache import SummaryCache, generation_settings
+from .jsonl import read_jsonl
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+_worker = {}
+
+def _init_worker(torch_threads, params):
+    import torch
+    from .summarization_model_handler import SummarizationModelHandler
+    torch.set_num_threads(torch_threads)
+    _worker['summarizer'] = SummarizationModelHandler()
+    _worker['params'] = params
+
+def _summarize_batch(batch):
+    """Runs in a worker: summarizes a batch of same-ratio tasks; returns (records, failed task count)."""
+    ratio = batch[0]['ratio']
+    try:
+        summaries = _worker['summarizer'].summarize_batch([task['content'] for task in batch], _worker['params'], ratio=ratio)
+    except Exception as e:
+        logger.error(f"Batch of {len(batch)} (books {sorted({task['book_id'] for task in batch})}) failed: {e}")
+        return [], len(batch)
+    return [
+        {"cache_key": task['cache_key'], "book_id": task['book_id'], "reading_time": task['reading_time'], "summary": summary}
+        for task, summary in zip(batch, summaries)
+    ], 0
+
+def load_checkpoint(path):
+    return {record['cache_key']: record for record in read_jsonl(path)}
+
+def build_tasks(df, params, done):
+    # Same keys as the API, so a store generated under another model, backend or mode is not reused
+    settings = generation_settings()
+    tasks = []
+    for book_id, content in df['content'].items():
+        for reading_time, ratio in config.READING_TIME_RATIOS.items():
+            cache_key = SummaryCache.make_key(content, ratio, params, settings)
+            if cache_key not in done:
+                tasks.append({"cache_key": cache_key, "book_id": int(book_id), "reading_time": reading_time, "ratio": ratio, "content": content})
+    return tasks
+
+def make_batches(tasks, batch_size):
+    """Groups tasks by ratio and summary length bounds, so each batch is exactly one padded
+    generate call; within a group, tasks are ordered by token length to limit padding."""
+    from transformers import AutoTokenizer
+    from .summarization_model_handler import SummarizationModelHandler
+
+    tokenizer = AutoTokenizer.from_pretrained(config.SUMMARIZATION_MODEL)
+    token_counts = {}
+    for task in tasks:
+        if task['book_id'] not in token_counts:
+            token_counts[task['book_id']] = len(tokenizer(task['content'])['input_ids'])
+
+    def group(task):
+        return task['ratio'], SummarizationModelHandler.length_bounds(token_counts[task['book_id']], task['ratio'])
+
+    tasks = sorted(tasks, key=lambda task: (group(task), token_counts[task['book_id']]))
+    batches = []
+    for task in tasks:
+        if batches and len(batches[-1]) < batch_size and group(batches[-1][0]) == group(task):
+            batches[-1].append(task)
+        else:
+            batches.append([task])
+    return batches
+
+def write_store(records, output_path):
+    df = pd.DataFrame(list(records), columns=["cache_key", "book_id", "reading_time", "summary"])
+    df.to_parquet(output_path, index=False)
+    logger.info(f"Wrote {len(df)} summaries to {output_path}")
+
+def load_store(path):
+    """cache_key -> summary, for serving precomputed summaries from the API."""
+    if not os.path.exists(path):
+        return {}
+    df = pd.read_parquet(path, columns=["cache_key", "summary"])
+    return dict(zip(df['cache_key'], df['summary']))
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-summarize the catalog for every reading time.")
+    parser.add_argument("--input", default=config.CLASSIFIED_BOOKS_PATH)
+    parser.add_argument("--output", default=config.PRESUMMARIZED_PATH)
+    parser.add_argument("--checkpoint", default=None, help="JSONL progress file (default: <output>.checkpoint.jsonl)")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--torch-threads", type=int, default=max(1, (os.cpu_count() or 1) // 2))
+    parser.add_argument("--batch-size", type=int, default=8)
+    args = parser.parse_args()
+    checkpoint_path = args.checkpoint or args.output + ".checkpoint.jsonl"
+
+    df = pd.read_json(args.input)
+    if 'book_id' not in df.columns:
+        df['book_id'] = range(len(df))
+    df = df.set_index('book_id')
+    df = df[df['content'].fillna('').str.strip() != '']
+    with open(config.BEST_PARAMS_PATH, 'r') as f:
+        params = json.load(f)
+
+    done = load_checkpoint(checkpoint_path)
+    tasks = build_tasks(df, params, done)
+    logger.info(f"{len(done)} summaries already checkpointed, {len(tasks)} to generate.")
+
+    failed = 0
+    if tasks:
+        batches = make_batches(tasks, args.batch_size)
+        ctx = mp.get_context("spawn")
+        with ctx.Pool(args.workers, initializer=_init_worker, initargs=(args.torch_threads, params)) as pool, \
+                open(checkpoint_path, 'a', encoding='utf-8') as checkpoint:
+            for n, (records, batch_failed) in enumerate(pool.imap_unordered(_summarize_batch, batches), start=1):
+                for record in records:
+                    checkpoint.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    done[record['cache_key']] = record
+                checkpoint.flush()
+                failed += batch_failed
+                status = f"FAILED ({batch_failed} summaries)" if batch_failed else "done"
+                logger.info(f"Batch {n}/{len(batches)} {status} ({len(done)} summaries total, {failed} failed).")
+
+    # Only keep summaries that still match the current catalog and params
+    current = {task['cache_key'] for task in build_tasks(df, params, {})}
+    write_store((record for key, record in done.items() if key in current), args.output)
+    if failed:
+        # Finished summaries are checkpointed, so a re-run only retries the failed ones
+        logger.error(f"{failed} of {len(tasks)} summaries failed and are missing from {args.output}; re-run to retry them.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
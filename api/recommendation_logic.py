@@ -1,31 +1,109 @@
+import numpy as np
 import pandas as pd
 
 from . import config
-def get_for_you_recommendations(df: pd.DataFrame, preferences: dict) -> pd.DataFrame:
-    """Gets personalized recommendations based on user preferences."""
+
+def build_label_score_matrix(df: pd.DataFrame):
+    """Builds a contiguous (books x labels) float32 score matrix and a label -> column index."""
+    labels = sorted({label for scores in df['classifications'] if isinstance(scores, dict) for label in scores})
+    label_index = {label: col for col, label in enumerate(labels)}
+
+    score_matrix = np.zeros((len(df), len(labels)), dtype=np.float32)
+    for row, scores in enumerate(df['classifications']):
+        if isinstance(scores, dict):
+            for label, score in scores.items():
+                score_matrix[row, label_index[label]] = score
+    return score_matrix, label_index
+
+def _label_weights(labels, label_index: dict, weight: float) -> np.ndarray:
+    """Weight vector over the matrix columns; labels missing from the catalog score 0."""
+    weights = np.zeros(len(label_index), dtype=np.float32)
+    for label in labels:
+        col = label_index.get(label)
+        if col is not None:
+            weights[col] = weight
+    return weights
+
+def top_k_positions(scores: np.ndarray, book_ids: np.ndarray, k: int) -> np.ndarray:
+    """Row positions of the k best scores, ties broken by ascending book_id, without a full sort."""
+    n = len(scores)
+    if k >= n:
+        candidates = np.arange(n)
+    else:
+        # Partial selection finds the k-th largest score; keep every row tied with it
+        # so the tie-break below stays deterministic.
+        kth_score = scores[np.argpartition(scores, n - k)[n - k]]
+        candidates = np.flatnonzero(scores >= kth_score)
+    order = np.lexsort((book_ids[candidates], -scores[candidates]))
+    return candidates[order[:k]]
+
+def user_label_key(preferences: dict) -> tuple:
+    """Canonical (sorted, deduped) label set for a user's preferences, used as the cache key."""
     user_labels = set(preferences.get('goals', []) + preferences.get('skills', []) + preferences.get('content_types', []))
     if preferences.get('habit_building', False):
         user_labels.add("Habit Improvement")
-    
+    return tuple(sorted(user_labels))
+
+def rank_for_you(score_matrix: np.ndarray, label_index: dict, book_ids: np.ndarray, user_labels: tuple) -> np.ndarray:
+    """Ranked book IDs for a canonical label set."""
+    # Mean score over the user's labels, as one matrix-vector product
+    relevance_scores = score_matrix @ _label_weights(user_labels, label_index, 1.0 / len(user_labels))
+    return book_ids[top_k_positions(relevance_scores, book_ids, config.N_RECOMMENDATIONS)]
+
+def get_for_you_recommendations(df: pd.DataFrame, score_matrix: np.ndarray, label_index: dict, preferences: dict, cache=None) -> pd.DataFrame:
+    """Gets personalized recommendations based on user preferences."""
+    user_labels = user_label_key(preferences)
     if not user_labels:
         return pd.DataFrame() # Return empty if no preferences
 
-    df['relevance_score'] = df['classifications'].apply(
-        lambda scores: sum(scores.get(label, 0) for label in user_labels) / len(user_labels) if user_labels else 0
-    )
-    
-   
-    final_books = df.sort_values(by='relevance_score', ascending=False).head(config.N_RECOMMENDATIONS)
-    return final_books
+    ranked_ids = cache.get(user_labels) if cache is not None else None
+    if ranked_ids is None:
+        ranked_ids = rank_for_you(score_matrix, label_index, df.index.to_numpy(), user_labels)
+        if cache is not None:
+            cache.put(user_labels, ranked_ids)
+    return df.loc[ranked_ids]
+
+def rank_for_you_batch(score_matrix: np.ndarray, label_index: dict, book_ids: np.ndarray, label_sets: list) -> list:
+    """Ranked book IDs for many canonical label sets, scored as (users x labels) @ (labels x books)."""
+    ranked = []
+    # Users per product, so the users x books score buffer stays within the element budget
+    chunk = max(1, config.BATCH_SCORING_MAX_ELEMENTS // max(len(book_ids), 1))
+    for start in range(0, len(label_sets), chunk):
+        batch = label_sets[start:start + chunk]
+        weights = np.stack([_label_weights(labels, label_index, 1.0 / len(labels)) for labels in batch])
+        # One contiguous row of book scores per user
+        relevance_scores = weights @ score_matrix.T
+        for row in relevance_scores:
+            ranked.append(book_ids[top_k_positions(row, book_ids, config.N_RECOMMENDATIONS)])
+    return ranked
+
+def get_for_you_batch(df: pd.DataFrame, score_matrix: np.ndarray, label_index: dict, preferences_list: list, cache=None) -> list:
+    """Personalized recommendations for many users at once; identical label sets are scored once."""
+    keys = [user_label_key(preferences) for preferences in preferences_list]
+
+    ranked_by_key = {}
+    for key in set(keys):
+        if key:
+            cached = cache.get(key) if cache is not None else None
+            if cached is not None:
+                ranked_by_key[key] = cached
 
-def get_top_rated_books(df: pd.DataFrame) -> pd.DataFrame:
+    missing = [key for key in dict.fromkeys(keys) if key and key not in ranked_by_key]
+    if missing:
+        for key, ranked_ids in zip(missing, rank_for_you_batch(score_matrix, label_index, df.index.to_numpy(), missing)):
+            ranked_by_key[key] = ranked_ids
+            if cache is not None:
+                cache.put(key, ranked_ids)
+
+    return [df.loc[ranked_by_key[key]] if key else pd.DataFrame() for key in keys]
+
+def get_top_rated_books(df: pd.DataFrame, score_matrix: np.ndarray, label_index: dict) -> pd.DataFrame:
     """Gets a general list of top-rated books based on key categories."""
     top_rated_categories = config.TOP_RATED_CATEGORIES
-    
+
     # Calculate a "top_rated_score" for each book by summing scores of important categories
-    df['top_rated_score'] = df['classifications'].apply(
-        lambda scores: sum(scores.get(cat, 0) for cat in top_rated_categories)
-    )
-    
+    top_rated_scores = score_matrix @ _label_weights(top_rated_categories, label_index, 1.0)
+
     # Return the top N books based on this new score
-    return df.sort_values(by='top_rated_score', ascending=False).head(config.N_RECOMMENDATIONS)
\ No newline at end of file
+    top = top_k_positions(top_rated_scores, df.index.to_numpy(), config.N_RECOMMENDATIONS)
+    return df.iloc[top].assign(top_rated_score=top_rated_scores[top])
@@ -0,0 +1,60 @@
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Thread-safe bounded LRU mapping with hit/miss/eviction counters.
+
+    Bounded by entry count and, when a `weigher` is given, by the total weight (e.g. bytes)
+    of the stored values.
+    """
+
+    def __init__(self, max_entries, max_weight=None, weigher=None):
+        self.max_entries = max_entries
+        self.max_weight = max_weight
+        self.weigher = weigher
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        weight = self.weigher(value) if self.weigher else 0
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.weight -= previous[1]
+            self._entries[key] = (value, weight)
+            self.weight += weight
+            while self._entries and (len(self._entries) > self.max_entries
+                                     or (self.max_weight is not None and self.weight > self.max_weight)):
+                _, (_, evicted_weight) = self._entries.popitem(last=False)
+                self.weight -= evicted_weight
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.weight = 0
+
+    def stats(self):
+        with self._lock:
+            stats = {"entries": len(self._entries), "max_entries": self.max_entries,
+                     "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+            if self.weigher:
+                stats.update(weight=self.weight, max_weight=self.max_weight)
+            return stats
@@ -0,0 +1,140 @@
+import os
+import json
+import logging
+from functools import lru_cache
+
+import numpy as np
+
+from . import config
+from .id_lookup import IdLookup
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=1)
+def load_encoder(model_name):
+    """Loads (once per process) the CPU sentence-embedding model."""
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name, device="cpu")
+
+def embed_texts(texts, model_name=None, batch_size=64):
+    """L2-normalized float32 embeddings, so cosine similarity is a dot product."""
+    encoder = load_encoder(model_name or config.EMBEDDING_MODEL)
+    embeddings = encoder.encode(list(texts), batch_size=batch_size, normalize_embeddings=True, show_progress_bar=len(texts) > batch_size)
+    return np.ascontiguousarray(embeddings, dtype=np.float32)
+
+def _nearest_centroid(vectors, centroids, chunk_size=65536):
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), chunk_size):
+        assignments[start:start + chunk_size] = np.argmax(vectors[start:start + chunk_size] @ centroids.T, axis=1)
+    return assignments
+
+def _spherical_kmeans(vectors, n_lists, n_iter, rng):
+    """Trains IVF centroids on a sample of the vectors (cosine k-means)."""
+    sample = vectors[rng.choice(len(vectors), min(len(vectors), n_lists * 64), replace=False)]
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+    for _ in range(n_iter):
+        assignments = _nearest_centroid(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        empty = np.bincount(assignments, minlength=n_lists) == 0
+        # Re-seed empty lists from random sample points so every list stays useful
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+    return centroids.astype(np.float32)
+
+
+class IVFIndex:
+    """Inverted-file ANN index: vectors are stored grouped by their nearest centroid, and a
+    query only scans the `nprobe` lists whose centroids are closest to it."""
+
+    FILES = ("centroids.npy", "vectors.npy", "book_ids.npy", "list_offsets.npy")
+
+    def __init__(self, centroids, vectors, book_ids, list_offsets, nprobe=8, model_name=None):
+        self.centroids = centroids
+        self.vectors = vectors
+        self.book_ids = book_ids
+        self.list_offsets = list_offsets
+        self.nprobe = nprobe
+        self.model_name = model_name
+        self._ids = IdLookup(book_ids)
+
+    @classmethod
+    def build(cls, embeddings, book_ids, n_lists=None, n_iter=20, seed=0, model_name=None):
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        book_ids = np.asarray(book_ids, dtype=np.int64)
+        n_lists = n_lists or max(1, int(4 * np.sqrt(len(embeddings))))
+        n_lists = min(n_lists, len(embeddings))
+
+        centroids = _spherical_kmeans(embeddings, n_lists, n_iter, np.random.default_rng(seed))
+        assignments = _nearest_centroid(embeddings, centroids)
+        order = np.argsort(assignments, kind='stable')
+        list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignments, minlength=n_lists), out=list_offsets[1:])
+        return cls(centroids, embeddings[order], book_ids[order], list_offsets, model_name=model_name)
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name, array in zip(self.FILES, (self.centroids, self.vectors, self.book_ids, self.list_offsets)):
+            np.save(os.path.join(directory, name), array)
+        with open(os.path.join(directory, "meta.json"), 'w') as f:
+            json.dump({"model_name": self.model_name, "dim": int(self.vectors.shape[1]), "n_lists": len(self.centroids)}, f)
+
+    @classmethod
+    def load(cls, directory, nprobe=8):
+        """Memory-maps the index arrays, so startup does not read the vectors into RAM."""
+        arrays = [np.load(os.path.join(directory, name), mmap_mode='r') for name in cls.FILES]
+        with open(os.path.join(directory, "meta.json"), 'r') as f:
+            meta = json.load(f)
+        return cls(*arrays, nprobe=nprobe, model_name=meta.get("model_name"))
+
+    def vector_for(self, book_id):
+        return np.asarray(self.vectors[self._ids.position(book_id)])
+
+    def search(self, query, k, exclude=()):
+        """Top-k (book_ids, cosine scores) for a normalized query vector."""
+        query = np.asarray(query, dtype=np.float32)
+        n_probe = min(self.nprobe, len(self.centroids))
+        centroid_scores = self.centroids @ query
+        probed = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+
+        ids, scores = [], []
+        for lst in probed:
+            start, end = self.list_offsets[lst], self.list_offsets[lst + 1]
+            if start < end:
+                ids.append(self.book_ids[start:end])
+                scores.append(self.vectors[start:end] @ query)
+        if not ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        ids, scores = np.concatenate(ids), np.concatenate(scores)
+
+        if len(exclude):
+            keep = ~np.isin(ids, exclude)
+            ids, scores = ids[keep], scores[keep]
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            ids, scores = ids[top], scores[top]
+        order = np.argsort(-scores, kind='stable')
+        return ids[order], scores[order]
+
+    def similar_to(self, book_id, k):
+        return self.search(self.vector_for(book_id), k, exclude=[book_id])
+
+    def search_text(self, text, k):
+        return self.search(embed_texts([text], self.model_name)[0], k)
+
+
+if __name__ == "__main__":
+    import pandas as pd
+
+    df = pd.read_json(config.CLASSIFIED_BOOKS_PATH)
+    if 'book_id' not in df.columns:
+        df['book_id'] = range(len(df))
+    df = df[df['content'].fillna('').str.strip() != '']
+
+    logger.info(f"Embedding {len(df)} books with {config.EMBEDDING_MODEL}...")
+    embeddings = embed_texts(df['content'].tolist(), config.EMBEDDING_MODEL)
+    index = IVFIndex.build(embeddings, df['book_id'].to_numpy(), model_name=config.EMBEDDING_MODEL)
+    index.save(config.SEMANTIC_INDEX_DIR)
+    logger.info(f"Saved IVF index with {len(index.centroids)} lists to {config.SEMANTIC_INDEX_DIR}")
@@ -1,66 +1,379 @@
 import os
+import asyncio
+import threading
 import torch
-from transformers import pipeline, AutoTokenizer, AutoModelForSeq2SeqLM
+from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, LogitsProcessor, LogitsProcessorList, TextStreamer
+from transformers.modeling_outputs import BaseModelOutput
 import logging
 
 from . import config
+from .result_cache import LRUCache
+from . import metrics
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+MAX_MODEL_LENGTH = 1024
+
 class SummarizationModelHandler:
-    _instance = None
+    _instances = {}
     
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super(SummarizationModelHandler, cls).__new__(cls)
-            cls._instance.summarizer_pipeline = None
-            cls._instance.tokenizer = None
-            cls._instance._initialize_model()
-        return cls._instance
+    def __new__(cls, backend=None):
+        # One instance per inference backend ("torch", "torch-int8" or "onnx")
+        backend = backend or config.SUMMARIZATION_BACKEND
+        if backend not in cls._instances:
+            instance = super(SummarizationModelHandler, cls).__new__(cls)
+            instance.backend = backend
+            instance.model = None
+            instance.tokenizer = None
+            instance.device = torch.device("cpu")
+            instance.draft_model = None
+            instance.encoder_cache = None
+            instance._initialize_model()
+            cls._instances[backend] = instance
+        return cls._instances[backend]
 
     def _initialize_model(self):
         try:
-            device = 0 if torch.cuda.is_available() else -1
             model_name = config.SUMMARIZATION_MODEL
-            
             self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-            model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
-            
-            self.summarizer_pipeline = pipeline(
-                "summarization",
-                model=model,
-                tokenizer=self.tokenizer,
-                device=device
-            )
-            logger.info(f"Summarizer ({model_name}) loaded successfully on {'GPU' if device != -1 else 'CPU'}.")
+
+            if self.backend == "onnx":
+                self.model = self._load_onnx_model(model_name)
+            else:
+                if self.backend != "torch-int8" and torch.cuda.is_available():
+                    self.device = torch.device("cuda:0")
+                self.model = self._load_torch_model(model_name)
+                self.encoder_cache = LRUCache(
+                    max_entries=config.ENCODER_CACHE_MAX_ENTRIES,
+                    max_weight=config.ENCODER_CACHE_MAX_MB * 2**20,
+                    weigher=lambda entry: entry[1].element_size() * entry[1].nelement() + 8 * len(entry[0]),
+                )
+
+            logger.info(f"Summarizer ({model_name}, backend={self.backend}) loaded successfully on {'GPU' if self.device.type == 'cuda' else 'CPU'}.")
         except Exception as e:
             logger.error(f"CRITICAL: Could not load summarization model: {e}.", exc_info=True)
+            return
 
-    def summarize_text(self, text, params, ratio=0.5):
-        if not self.summarizer_pipeline:
-            return "Error: Summarizer not initialized."
+        if config.SUMMARIZATION_DRAFT_MODEL:
+            try:
+                self._initialize_draft_model(config.SUMMARIZATION_DRAFT_MODEL)
+            except Exception as e:
+                logger.error(f"Could not load draft model, speculative decoding disabled: {e}.", exc_info=True)
+
+    def _load_torch_model(self, model_name):
+        model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
+        if self.backend == "torch-int8":
+            # Dynamic int8 quantization of the Linear layers; CPU only
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return model.to(self.device).eval()
+
+    def _initialize_draft_model(self, draft_name):
+        """Small seq2seq model (same tokenizer) that proposes tokens for the main model to verify."""
+        if self.backend == "onnx":
+            logger.warning("Speculative decoding is not supported with the onnx backend; ignoring the draft model.")
+            return
+        self.draft_model = self._load_torch_model(draft_name)
 
-        max_model_length = 1024
-        inputs = self.tokenizer(text, return_tensors="pt", truncation=True, max_length=max_model_length)
-        
-        num_input_tokens = len(inputs['input_ids'][0])
+        # Decoder forward passes are counted per thread during assisted generation: every main-model
+        # pass verifies a run of draft tokens and contributes one token of its own.
+        self._spec_calls = threading.local()
+        self._spec_lock = threading.Lock()
+        self._spec_totals = {"generations": 0, "generated_tokens": 0, "main_steps": 0, "draft_tokens": 0}
+        self.model.get_decoder().register_forward_hook(lambda *_: self._count_decoder_call("main"))
+        self.draft_model.get_decoder().register_forward_hook(lambda *_: self._count_decoder_call("draft"))
+        logger.info(f"Speculative decoding enabled with draft model {draft_name}.")
+
+    def _count_decoder_call(self, which):
+        counts = getattr(self._spec_calls, "counts", None)
+        if counts is not None:
+            counts[which] += 1
+
+    def speculative_stats(self):
+        """Cumulative assisted-generation counters; acceptance_rate = accepted / proposed draft tokens."""
+        if self.draft_model is None:
+            return None
+        with self._spec_lock:
+            totals = dict(self._spec_totals)
+        accepted = totals["generated_tokens"] - totals["main_steps"]
+        totals["accepted_draft_tokens"] = accepted
+        totals["acceptance_rate"] = accepted / totals["draft_tokens"] if totals["draft_tokens"] else None
+        totals["tokens_per_main_step"] = totals["generated_tokens"] / totals["main_steps"] if totals["main_steps"] else None
+        return totals
+
+    @staticmethod
+    def _load_onnx_model(model_name):
+        """ONNX Runtime encoder/decoder with KV-cache, exported once and reused from config.ONNX_MODEL_DIR."""
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+
+        if os.path.isdir(config.ONNX_MODEL_DIR):
+            return ORTModelForSeq2SeqLM.from_pretrained(config.ONNX_MODEL_DIR, use_cache=True)
+        logger.info(f"Exporting {model_name} to ONNX (one-time) into {config.ONNX_MODEL_DIR}...")
+        model = ORTModelForSeq2SeqLM.from_pretrained(model_name, export=True, use_cache=True)
+        model.save_pretrained(config.ONNX_MODEL_DIR)
+        return model
+
+    @staticmethod
+    def _generation_lengths(num_input_tokens, ratio):
         target_token_count = int(num_input_tokens * ratio)
-        
-        min_len = int(target_token_count * 0.7)
-        max_len = int(target_token_count * 1.3)
+        # Targets are bucketed so documents of similar length share (min_len, max_len) and can be
+        # batched into one generate call: min uses the bucket's lower edge, max its upper edge
+        bucket = config.SUMMARY_LENGTH_BUCKET
+        low = target_token_count // bucket * bucket if bucket else target_token_count
+        high = low + bucket if bucket else target_token_count
+
+        min_len = int(low * 0.7)
+        max_len = int(high * 1.3)
         if min_len < 30: min_len = 30
         if max_len < 40: max_len = 40
+        return min_len, max_len
+
+    @staticmethod
+    def _capped_lengths(lengths):
+        # Targets derived from a full long document can exceed what the model can generate
+        min_len, max_len = lengths
+        return min(min_len, int(MAX_MODEL_LENGTH * 0.7)), min(max_len, MAX_MODEL_LENGTH)
+
+    @classmethod
+    def length_bounds(cls, num_tokens, ratio):
+        """(min_len, max_len) summarize_batch uses for a text of `num_tokens` tokens (special tokens
+        included, untruncated); texts with equal bounds share one generate call."""
+        if config.SUMMARIZATION_MODE == "hierarchical":
+            return cls._capped_lengths(cls._generation_lengths(num_tokens, ratio))
+        return cls._generation_lengths(min(num_tokens, MAX_MODEL_LENGTH), ratio)
+
+    def _pin_seed(self):
+        # With do_sample=True, a pinned seed makes summaries (and cached entries) reproducible
+        if config.SUMMARY_SEED is not None:
+            torch.manual_seed(config.SUMMARY_SEED)
+
+    def _generate(self, documents, min_len, max_len, params, streamer=None, encoder_states=None):
+        """One padded `generate` call over already-tokenized documents.
+
+        `encoder_states` (one unpadded hidden-state tensor per document) skips the encoder pass.
+        """
+        if self.draft_model is not None and len(documents) > 1:
+            # Assisted generation only supports batch size 1
+            return [
+                summary
+                for i, document in enumerate(documents)
+                for summary in self._generate([document], min_len, max_len, params, streamer,
+                                              None if encoder_states is None else [encoder_states[i]])
+            ]
+
+        batch = self.tokenizer.pad({"input_ids": documents}, return_tensors="pt")
+        generate_kwargs, counts = {"min_length": min_len}, None
+        if encoder_states is not None:
+            # Zero padding is fine: padded positions are masked out of cross-attention
+            hidden = torch.nn.utils.rnn.pad_sequence(encoder_states, batch_first=True)
+            generate_kwargs["encoder_outputs"] = BaseModelOutput(last_hidden_state=hidden.to(self.device))
+        if self.draft_model is not None:
+            # Assisted generation rejects min_length/min_new_tokens, so the minimum is enforced by a custom processor
+            del generate_kwargs["min_length"]
+            generate_kwargs["assistant_model"] = self.draft_model
+            generate_kwargs["logits_processor"] = LogitsProcessorList([_MinLengthProcessor(min_len, self.tokenizer.eos_token_id)])
+            counts = self._spec_calls.counts = {"main": 0, "draft": 0}
+        self._pin_seed()
+        metrics.SUMMARY_INPUT_TOKENS.inc(sum(len(ids) for ids in documents))
+        try:
+            with metrics.GENERATE.time():
+                summary_ids = self.model.generate(
+                    batch['input_ids'].to(self.device),
+                    attention_mask=batch['attention_mask'].to(self.device),
+                    max_length=max_len,
+                    streamer=streamer,
+                    **generate_kwargs,
+                    **params
+                )
+        finally:
+            if counts is not None:
+                self._spec_calls.counts = None
+        if counts is not None:
+            with self._spec_lock:
+                self._spec_totals["generations"] += 1
+                # Summary ids start with the decoder start token
+                self._spec_totals["generated_tokens"] += summary_ids.shape[1] - 1
+                self._spec_totals["main_steps"] += counts["main"]
+                self._spec_totals["draft_tokens"] += counts["draft"]
+        # Summary ids start with the decoder start token and are right-padded
+        metrics.SUMMARY_OUTPUT_TOKENS.inc(int((summary_ids[:, 1:] != self.tokenizer.pad_token_id).sum()))
+        with metrics.DECODE.time():
+            return self.tokenizer.batch_decode(summary_ids, skip_special_tokens=True)
+
+    def _chunk_windows(self, ids):
+        """Overlapping token windows that together cover the whole document."""
+        window = MAX_MODEL_LENGTH - 1  # room for </s>
+        step = window - config.SUMMARY_CHUNK_OVERLAP
+        windows, start = [], 0
+        while True:
+            windows.append(ids[start:start + window])
+            if start + window >= len(ids):
+                return windows
+            start += step
+
+    def _truncated_documents(self, texts, ratio):
+        with metrics.TOKENIZATION.time():
+            documents = self.tokenizer(list(texts), truncation=True, max_length=MAX_MODEL_LENGTH)['input_ids']
+        return documents, [self._generation_lengths(len(ids), ratio) for ids in documents], None
+
+    def _encoded_documents(self, texts, ratio, cache_keys):
+        """Token ids and encoder hidden states per document, reused from the encoder cache.
+
+        The reading-time ratio only changes generation lengths, so entries are shared across
+        variants; misses are tokenized and encoded together in one padded batch.
+        """
+        keys = [(key, hash(text)) for key, text in zip(cache_keys, texts)]
+        entries = [self.encoder_cache.get(key) for key in keys]
+        missing = [i for i, entry in enumerate(entries) if entry is None]
+        if missing:
+            with metrics.TOKENIZATION.time():
+                ids = self.tokenizer([texts[i] for i in missing], truncation=True, max_length=MAX_MODEL_LENGTH)['input_ids']
+            batch = self.tokenizer.pad({"input_ids": ids}, return_tensors="pt")
+            with torch.no_grad(), metrics.ENCODE.time():
+                hidden = self.model.get_encoder()(
+                    input_ids=batch['input_ids'].to(self.device),
+                    attention_mask=batch['attention_mask'].to(self.device),
+                ).last_hidden_state
+            for j, i in enumerate(missing):
+                entries[i] = (ids[j], hidden[j, :len(ids[j])].clone())
+                self.encoder_cache.put(keys[i], entries[i])
+
+        documents = [entry[0] for entry in entries]
+        return documents, [self._generation_lengths(len(ids), ratio) for ids in documents], [entry[1] for entry in entries]
+
+    def _hierarchical_documents(self, texts, params, ratio):
+        """Map step of the long-document mode.
+
+        Documents that fit the model window are used as-is. Longer ones are split into
+        overlapping windows, all windows of all documents are summarized in padded batches,
+        and each document becomes the concatenation of its window summaries. Target lengths
+        always come from the full document length.
+        """
+        eos = [self.tokenizer.eos_token_id]
+        documents, lengths, chunks, owners, chunk_lengths = [], [], [], [], []
+        with metrics.TOKENIZATION.time():
+            tokenized = self.tokenizer(list(texts), add_special_tokens=False)['input_ids']
+        for i, ids in enumerate(tokenized):
+            lengths.append(self._capped_lengths(self._generation_lengths(len(ids) + 1, ratio)))
+            windows = self._chunk_windows(ids)
+            documents.append(windows[0] + eos if len(windows) == 1 else None)
+            if len(windows) > 1:
+                # Each window summary gets an equal share of the model window, so the concatenation
+                # of this document's window summaries fits the final (reduce) pass
+                budget = (MAX_MODEL_LENGTH - 1) // len(windows)
+                chunk_target = min(int((max(len(window) for window in windows) + 1) * ratio), budget)
+                bounds = (max(int(chunk_target * 0.7), 1), max(min(int(chunk_target * 1.3), budget), 2))
+                chunks.extend(window + eos for window in windows)
+                owners.extend([i] * len(windows))
+                chunk_lengths.extend([bounds] * len(windows))
+        if not chunks:
+            return documents, lengths, None
+
+        chunk_summaries = self._generate_grouped(chunks, chunk_lengths, params, batch_size=config.SUMMARY_CHUNK_BATCH_SIZE)
+
+        for i in dict.fromkeys(owners):
+            combined = " ".join(summary for owner, summary in zip(owners, chunk_summaries) if owner == i)
+            documents[i] = self.tokenizer(combined, truncation=True, max_length=MAX_MODEL_LENGTH)['input_ids']
+        return documents, lengths, None
+
+    def _prepare_documents(self, texts, params, ratio, cache_keys=None):
+        if config.SUMMARIZATION_MODE == "hierarchical":
+            return self._hierarchical_documents(texts, params, ratio)
+        if cache_keys is not None and self.encoder_cache is not None:
+            return self._encoded_documents(texts, ratio, cache_keys)
+        return self._truncated_documents(texts, ratio)
+
+    def summarize_text(self, text, params, ratio=0.5):
+        if self.model is None:
+            return "Error: Summarizer not initialized."
 
         try:
-            summary_ids = self.summarizer_pipeline.model.generate(
-                inputs['input_ids'].to(self.summarizer_pipeline.device),
-                min_length=min_len, 
-                max_length=max_len, 
-                **params
-            )
-            summary = self.tokenizer.decode(summary_ids[0], skip_special_tokens=True)
-            return summary
+            return self.summarize_batch([text], params, ratio=ratio)[0]
         except Exception as e:
             logger.error(f"Error during summarization with params {params}: {e}")
-            return "Error: Could not generate summary."
\ No newline at end of file
+            return "Error: Could not generate summary."
+
+    def _generate_grouped(self, documents, lengths, params, encoder_states=None, batch_size=None):
+        """Runs `_generate` per distinct (min_len, max_len), at most `batch_size` documents at a time,
+        so every document keeps its own bounds.
+
+        `generate` takes a single min/max length per call. With a pinned seed and sampling, every
+        document is generated on its own: rows of one batch share the RNG stream, so a batched
+        summary would depend on the other requests it was batched with.
+        """
+        groups = {}
+        pinned = config.SUMMARY_SEED is not None and params.get('do_sample')
+        for i, bounds in enumerate(lengths):
+            groups.setdefault((i,) if pinned else bounds, []).append(i)
+        summaries = [None] * len(documents)
+        for group in groups.values():
+            step = batch_size or len(group)
+            for start in range(0, len(group), step):
+                rows = group[start:start + step]
+                min_len, max_len = lengths[rows[0]]
+                outputs = self._generate([documents[i] for i in rows], min_len, max_len, params,
+                                         encoder_states=None if encoder_states is None else [encoder_states[i] for i in rows])
+                for i, summary in zip(rows, outputs):
+                    summaries[i] = summary
+        return summaries
+
+    def summarize_batch(self, texts, params, ratio=0.5, cache_keys=None):
+        """Summarizes several texts with padded `generate` calls.
+
+        Texts are batched together when their target lengths match (e.g. all books that fill
+        the model window), so a summary never depends on what it was batched with.
+        `cache_keys` (e.g. book ids) enable reuse of cached encoder outputs.
+        """
+        if self.model is None:
+            raise RuntimeError("Summarizer not initialized.")
+
+        documents, lengths, encoder_states = self._prepare_documents(texts, params, ratio, cache_keys)
+        return self._generate_grouped(documents, lengths, params, encoder_states=encoder_states)
+
+    def generate_streaming(self, text, params, streamer, ratio=0.5, cache_key=None):
+        """Runs `generate` in the calling thread, pushing decoded text into `streamer` as tokens are produced."""
+        if self.model is None:
+            raise RuntimeError("Summarizer not initialized.")
+
+        documents, lengths, encoder_states = self._prepare_documents(
+            [text], params, ratio, None if cache_key is None else [cache_key]
+        )
+        self._generate(documents, *lengths[0], params, streamer=streamer, encoder_states=encoder_states)
+
+
+class _MinLengthProcessor(LogitsProcessor):
+    """Blocks EOS until `min_length` tokens exist; stands in for MinLengthLogitsProcessor, which assisted generation rejects."""
+
+    def __init__(self, min_length, eos_token_id):
+        self.min_length = min_length
+        self.eos_token_id = eos_token_id
+
+    def __call__(self, input_ids, scores):
+        if input_ids.shape[-1] < self.min_length:
+            scores = scores.clone()
+            scores[:, self.eos_token_id] = -float("inf")
+        return scores
+
+
+class AsyncTextStreamer(TextStreamer):
+    """TextStreamer that hands decoded text from the generating thread to an asyncio consumer."""
+
+    def __init__(self, tokenizer, loop):
+        super().__init__(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        self.loop = loop
+        self.pieces = asyncio.Queue()
+
+    def on_finalized_text(self, text, stream_end=False):
+        if text:
+            self.loop.call_soon_threadsafe(self.pieces.put_nowait, text)
+        if stream_end:
+            self.loop.call_soon_threadsafe(self.pieces.put_nowait, None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        piece = await self.pieces.get()
+        if piece is None:
+            raise StopAsyncIteration
+        return piece
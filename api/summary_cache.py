@@ -0,0 +1,103 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+
+def generation_settings():
+    """Every config value that changes a generated summary, so switching any of them misses old entries."""
+    settings = {
+        "model": config.SUMMARIZATION_MODEL, "backend": config.SUMMARIZATION_BACKEND,
+        "draft_model": config.SUMMARIZATION_DRAFT_MODEL, "mode": config.SUMMARIZATION_MODE, "seed": config.SUMMARY_SEED,
+        "length_bucket": config.SUMMARY_LENGTH_BUCKET,
+    }
+    if config.SUMMARIZATION_MODE == "hierarchical":
+        settings.update(chunk_overlap=config.SUMMARY_CHUNK_OVERLAP, chunk_batch_size=config.SUMMARY_CHUNK_BATCH_SIZE)
+    return settings
+
+
+class SummaryCache:
+    """Disk-backed LRU cache of generated summaries.
+
+    SQLite in WAL mode lets every uvicorn worker process share the same file, and entries
+    survive restarts. The least recently read entries are evicted past `max_entries`.
+    """
+
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        self.enabled = True
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            conn = self._connection()
+            conn.execute("CREATE TABLE IF NOT EXISTS summaries (key TEXT PRIMARY KEY, summary TEXT NOT NULL, last_access REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS summaries_last_access ON summaries (last_access)")
+            conn.commit()
+        except (OSError, sqlite3.Error) as e:
+            # e.g. a read-only data directory; summaries are then generated on every request
+            logger.error(f"Summary cache at {path} unavailable, continuing without it: {e}")
+            self.enabled = False
+
+    def _connection(self):
+        # sqlite3 connections must not be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(content, ratio, params, settings=None):
+        """`settings` defaults to `generation_settings()`, the config a summary was generated under."""
+        payload = json.dumps([content, ratio, params, settings or generation_settings()], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        if not self.enabled:
+            self.misses += 1
+            return None
+        try:
+            conn = self._connection()
+            row = conn.execute("SELECT summary FROM summaries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE summaries SET last_access = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+            self.hits += 1
+            return row[0]
+        except sqlite3.Error as e:
+            logger.error(f"Summary cache read failed: {e}")
+            return None
+
+    def put(self, key, summary):
+        if not self.enabled:
+            return
+        try:
+            conn = self._connection()
+            conn.execute("INSERT OR REPLACE INTO summaries (key, summary, last_access) VALUES (?, ?, ?)", (key, summary, time.time()))
+            conn.execute(
+                "DELETE FROM summaries WHERE key IN (SELECT key FROM summaries ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Summary cache write failed: {e}")
+
+    def stats(self):
+        if not self.enabled:
+            return {"entries": 0, "max_entries": self.max_entries, "hits": self.hits, "misses": self.misses, "enabled": False}
+        entries = self._connection().execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+        return {"entries": entries, "max_entries": self.max_entries, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,100 @@
+"""Synthetic catalogs and a tiny stand-in summarization model, so benchmarks run offline on CPU."""
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+# Same label set as code/classify_books.py produces
+LABELS = [
+    "Personal Development", "Career Success", "Strengthening Relationships",
+    "Habit Improvement", "Productivity Enhancement", "Building Self-Confidence",
+    "Leadership", "Time Management", "Emotional Intelligence",
+    "Critical Thinking", "Finance and Investment", "Happiness and Well-Being",
+    "Real-Life Stories", "Practical Steps", "Inspiration and Motivation"
+]
+WORDS = ["habit", "focus", "money", "lead", "mind", "the", "a", "book", "and", "of"] + [f"w{i}" for i in range(500)]
+
+SCALES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+
+def make_catalog(n_books, content_words=200, seed=0):
+    """Classified-catalog DataFrame with the same columns and `classifications` schema as classified_books.json."""
+    rng = np.random.default_rng(seed)
+    scores = np.round(rng.random((n_books, len(LABELS)), dtype=np.float32), 4)
+    words = np.array(WORDS)
+    return pd.DataFrame({
+        "book_id": np.arange(n_books),
+        "title": [f"Book {i}" for i in range(n_books)],
+        "url": "",
+        "cover_url": [f"https://covers.example/{i}.jpg" for i in range(n_books)],
+        "content": [" ".join(row) for row in words[rng.integers(0, len(words), (n_books, content_words))]],
+        "classifications": [dict(zip(LABELS, row.tolist())) for row in scores],
+    })
+
+
+def make_preferences(n_users, seed=0):
+    """Random /recommendations/for-you request bodies."""
+    rng = np.random.default_rng(seed)
+    users = []
+    for _ in range(n_users):
+        labels = rng.choice(LABELS, size=rng.integers(1, 5), replace=False).tolist()
+        split = rng.integers(0, len(labels) + 1)
+        users.append({"goals": labels[:split], "skills": labels[split:], "content_types": [],
+                      "habit_building": bool(rng.random() < 0.3)})
+    return users
+
+
+def make_tiny_model(directory, seed=0):
+    """A randomly initialised two-layer Pegasus with a word-level tokenizer over WORDS."""
+    if os.path.exists(os.path.join(directory, "config.json")):
+        return directory
+    import torch
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers
+    from tokenizers.processors import TemplateProcessing
+    from transformers import PreTrainedTokenizerFast, PegasusConfig, PegasusForConditionalGeneration
+
+    vocab = {"<pad>": 0, "</s>": 1, "<unk>": 2}
+    for word in WORDS:
+        vocab[word] = len(vocab)
+    tokenizer = Tokenizer(models.WordLevel(vocab=vocab, unk_token="<unk>"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer.post_processor = TemplateProcessing(single="$A </s>", special_tokens=[("</s>", 1)])
+    tokenizer.decoder = decoders.WordPiece(prefix="##")
+    tokenizer = PreTrainedTokenizerFast(tokenizer_object=tokenizer, pad_token="<pad>", eos_token="</s>",
+                                        unk_token="<unk>", model_max_length=1024)
+
+    model_config = PegasusConfig(
+        vocab_size=len(vocab), d_model=32, encoder_layers=2, decoder_layers=2,
+        encoder_attention_heads=2, decoder_attention_heads=2, encoder_ffn_dim=64, decoder_ffn_dim=64,
+        max_position_embeddings=1024, pad_token_id=0, eos_token_id=1, decoder_start_token_id=0,
+    )
+    torch.manual_seed(seed)
+    PegasusForConditionalGeneration(model_config).save_pretrained(directory)
+    tokenizer.save_pretrained(directory)
+    return directory
+
+
+def prepare_server_data(directory, n_books, seed=0):
+    """Writes everything the API loads at startup for an `n_books` synthetic catalog; returns config overrides."""
+    from api.catalog import Catalog
+
+    os.makedirs(directory, exist_ok=True)
+    catalog_dir = os.path.join(directory, "catalog")
+    if not os.path.exists(os.path.join(catalog_dir, "meta.json")):
+        Catalog.from_frame(make_catalog(n_books, seed=seed)).save(catalog_dir)
+    params_path = os.path.join(directory, "best_summary_params.json")
+    with open(params_path, 'w') as f:
+        json.dump({"do_sample": False, "repetition_penalty": 1.3}, f)
+    return {
+        "CATALOG_DIR": catalog_dir,
+        "CLASSIFIED_BOOKS_PATH": os.path.join(directory, "classified_books.json"),
+        "BEST_PARAMS_PATH": params_path,
+        "SEMANTIC_INDEX_DIR": os.path.join(directory, "semantic_index"),
+        "SUMMARY_CACHE_PATH": os.path.join(directory, "summary_cache.sqlite3"),
+        "PRESUMMARIZED_PATH": os.path.join(directory, "presummarized_books.parquet"),
+        "SUMMARIZATION_MODEL": make_tiny_model(os.path.join(os.path.dirname(directory), "tiny_pegasus"), seed),
+        "SUMMARIZATION_BACKEND": "torch",
+        "SUMMARIZATION_DRAFT_MODEL": None,
+        "CATALOG_WATCH_INTERVAL_SECONDS": None,
+    }
@@ -0,0 +1,118 @@
+"""Closed-loop HTTP load generator against a locally started API process."""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import subprocess
+from collections import Counter
+
+import httpx
+
+from .fixtures import make_preferences, prepare_server_data
+from .micro import percentiles
+
+
+def _scenarios(n_books, rng):
+    users = make_preferences(512, seed=1)
+    reading_times = ["5 minutes", "10 minutes", "15+ minutes"]
+    return {
+        "top_rated": lambda: ("GET", "/recommendations/top-rated", None),
+        "for_you": lambda: ("POST", "/recommendations/for-you", rng.choice(users)),
+        "for_you_batch": lambda: ("POST", "/recommendations/for-you/batch", rng.sample(users, 32)),
+        # Random books, so most requests miss the summary cache and reach the tiny model
+        "summary": lambda: ("POST", "/summary", {"book_id": rng.randrange(n_books), "reading_time": rng.choice(reading_times)}),
+    }
+
+
+async def _drive(client, make_request, concurrency, duration):
+    latencies, statuses = [], Counter()
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            method, path, body = make_request()
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                statuses[response.status_code] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    result = percentiles(latencies) if latencies else {"n": 0}
+    result.update(requests_per_second=len(latencies) / elapsed, statuses={str(k): v for k, v in statuses.items()})
+    return result
+
+
+def _peak_rss_mb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return None
+
+
+def _wait_ready(base_url, process, timeout=600):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"API process exited with code {process.returncode}")
+        try:
+            ready = httpx.get(f"{base_url}/ready", timeout=5).json()
+            if ready["components"]["summarizer"] != "loading":
+                return ready
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError("API did not become ready")
+
+
+def run(n_books, work_dir, scenarios=None, concurrency=16, duration=10.0, port=8765, seed=0):
+    """Starts the API on a synthetic `n_books` catalog and load-tests each scenario in turn."""
+    data_dir = os.path.join(work_dir, f"catalog_{n_books}")
+    overrides = prepare_server_data(data_dir, n_books, seed=seed)
+    if os.path.exists(overrides["SUMMARY_CACHE_PATH"]):
+        os.remove(overrides["SUMMARY_CACHE_PATH"])  # every run starts cold
+    overrides_path = os.path.join(data_dir, "overrides.json")
+    with open(overrides_path, 'w') as f:
+        json.dump(overrides, f)
+
+    base_url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-m", "benchmarks.serve", "--overrides", overrides_path, "--port", str(port)])
+    try:
+        _wait_ready(base_url, process)
+        report = {"n_books": n_books, "concurrency": concurrency, "duration_s": duration,
+                  "startup_seconds": time.perf_counter() - started, "scenarios": {}}
+        rng = random.Random(seed)
+        makers = _scenarios(n_books, rng)
+
+        async def drive_all():
+            limits = httpx.Limits(max_connections=concurrency)
+            async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+                for name in scenarios or list(makers):
+                    report["scenarios"][name] = await _drive(client, makers[name], concurrency, duration)
+
+        asyncio.run(drive_all())
+        report["server_peak_rss_mb"] = _peak_rss_mb(process.pid)
+        return report
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def summarize(report):
+    lines = [f"  startup {report['startup_seconds']:.2f}s, server peak RSS {report['server_peak_rss_mb']:.0f} MB"]
+    for name, result in report["scenarios"].items():
+        if result["n"]:
+            lines.append(f"  {name:16s} {result['requests_per_second']:8.1f} req/s  p50={result['p50_ms']:8.2f}ms "
+                         f"p95={result['p95_ms']:8.2f}ms p99={result['p99_ms']:8.2f}ms  {result['statuses']}")
+        else:
+            lines.append(f"  {name:16s} no completed requests {result['statuses']}")
+    return "\n".join(lines)
@@ -0,0 +1,83 @@
+"""Microbenchmarks of the recommendation scoring path on a synthetic catalog."""
+import time
+import resource
+
+import numpy as np
+
+from api import config
+from api import recommendation_logic
+from api.catalog import Catalog
+
+from .fixtures import make_catalog, make_preferences
+
+
+def percentiles(samples):
+    """Latency summary in milliseconds."""
+    ms = np.asarray(samples) * 1000
+    return {"n": len(ms), "mean_ms": float(ms.mean()), "p50_ms": float(np.percentile(ms, 50)),
+            "p95_ms": float(np.percentile(ms, 95)), "p99_ms": float(np.percentile(ms, 99))}
+
+
+def time_calls(fn, min_runs=5, min_seconds=0.5):
+    """Runs `fn` at least `min_runs` times and for at least `min_seconds`; returns per-call seconds."""
+    fn()  # warm-up
+    samples, deadline = [], time.perf_counter() + min_seconds
+    while len(samples) < min_runs or time.perf_counter() < deadline:
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def run(n_books, n_users=256, seed=0):
+    """Benchmarks every scoring function on an `n_books` catalog; runs in its own process for clean RSS."""
+    df = make_catalog(n_books, content_words=20, seed=seed)
+    users = make_preferences(n_users, seed=seed)
+    label_sets = [recommendation_logic.user_label_key(user) for user in users]
+
+    results = {}
+    start = time.perf_counter()
+    score_matrix, label_index = recommendation_logic.build_label_score_matrix(df)
+    results["build_label_score_matrix"] = {"seconds": time.perf_counter() - start}
+    start = time.perf_counter()
+    catalog = Catalog.from_frame(df)
+    results["catalog_from_frame"] = {"seconds": time.perf_counter() - start}
+
+    start = time.perf_counter()
+    frame = catalog.frame()
+    results["catalog_frame"] = {"seconds": time.perf_counter() - start}
+    book_ids = frame.index.to_numpy()
+    scores = score_matrix @ np.full(len(label_index), 1.0 / len(label_index), dtype=np.float32)
+    users_iter = iter(range(10**9))
+
+    results["top_k_positions"] = percentiles(time_calls(
+        lambda: recommendation_logic.top_k_positions(scores, book_ids, config.N_RECOMMENDATIONS)))
+    results["rank_for_you"] = percentiles(time_calls(
+        lambda: recommendation_logic.rank_for_you(score_matrix, label_index, book_ids, label_sets[next(users_iter) % n_users])))
+    results["get_for_you_recommendations"] = percentiles(time_calls(
+        lambda: recommendation_logic.get_for_you_recommendations(frame, score_matrix, label_index, users[next(users_iter) % n_users])))
+    batch = percentiles(time_calls(
+        lambda: recommendation_logic.rank_for_you_batch(score_matrix, label_index, book_ids, label_sets), min_runs=3))
+    batch["users_per_second"] = n_users / (batch["mean_ms"] / 1000)
+    results["rank_for_you_batch"] = batch
+    results["get_top_rated_books"] = percentiles(time_calls(
+        lambda: recommendation_logic.get_top_rated_books(frame, score_matrix, label_index)))
+    top = recommendation_logic.get_for_you_recommendations(frame, score_matrix, label_index, users[0])
+    results["serialize_top_k"] = percentiles(time_calls(
+        lambda: [{"book_id": int(i), "title": catalog.text('title', row), "cover_url": catalog.text('cover_url', row)}
+                 for i, row in zip(top.index, top['row'])]))
+
+    return {"n_books": n_books, "n_users": n_users, "results": results,
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+
+def summarize(report):
+    """One line per benchmark for console output."""
+    lines = []
+    for name, result in report["results"].items():
+        if "p50_ms" in result:
+            lines.append(f"  {name:32s} p50={result['p50_ms']:9.3f}ms p99={result['p99_ms']:9.3f}ms")
+        else:
+            lines.append(f"  {name:32s} {result['seconds']:9.3f}s")
+    return "\n".join(lines)
+
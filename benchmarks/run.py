@@ -0,0 +1,82 @@
+"""Benchmark suite entry point: scoring microbenchmarks and HTTP load tests at several catalog scales.
+
+Everything runs offline on CPU: catalogs are synthetic (same `classifications` schema as
+classified_books.json) and summarization uses a tiny randomly initialised Pegasus. The JSON
+report is meant to be diffed across commits.
+
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.run --scales 1k,10k,100k --output bench.json
+    python -m benchmarks.run --scales 1m --skip-load
+"""
+import os
+import json
+import time
+import argparse
+import platform
+import subprocess
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from . import micro, load
+from .fixtures import SCALES
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _run_micro(n_books, seed):
+    # A fresh process per scale, so peak RSS is not inherited from a larger catalog
+    with ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context("spawn")) as executor:
+        return executor.submit(micro.run, n_books, seed=seed).result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the BookWise benchmark suite.")
+    parser.add_argument("--scales", default="1k,10k,100k,1m", help=f"Comma-separated subset of {','.join(SCALES)}")
+    parser.add_argument("--work-dir", default=os.path.join("benchmarks", ".work"), help="Where synthetic data and the tiny model are cached")
+    parser.add_argument("--output", default=None, help="Path for the JSON report (default: stdout only)")
+    parser.add_argument("--skip-micro", action="store_true")
+    parser.add_argument("--skip-load", action="store_true")
+    parser.add_argument("--scenarios", default=None, help="Comma-separated load scenarios (default: all)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per load scenario")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    scales = [scale.strip().lower() for scale in args.scales.split(",")]
+    unknown = [scale for scale in scales if scale not in SCALES]
+    if unknown:
+        parser.error(f"Unknown scales {unknown}; choose from {list(SCALES)}")
+    os.makedirs(args.work_dir, exist_ok=True)
+
+    report = {
+        "commit": _git_commit(), "timestamp": time.time(), "python": platform.python_version(),
+        "numpy": np.__version__, "machine": platform.machine(), "cpu_count": os.cpu_count(),
+        "seed": args.seed, "micro": {}, "load": {},
+    }
+    for scale in scales:
+        n_books = SCALES[scale]
+        if not args.skip_micro:
+            report["micro"][scale] = _run_micro(n_books, args.seed)
+            print(f"[micro {scale}]\n{micro.summarize(report['micro'][scale])}", flush=True)
+        if not args.skip_load:
+            scenarios = args.scenarios.split(",") if args.scenarios else None
+            report["load"][scale] = load.run(n_books, os.path.abspath(args.work_dir), scenarios=scenarios,
+                                             concurrency=args.concurrency, duration=args.duration,
+                                             port=args.port, seed=args.seed)
+            print(f"[load {scale}]\n{load.summarize(report['load'][scale])}", flush=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""Runs the API under uvicorn with `api.config` values overridden from a JSON file.
+
+    python -m benchmarks.serve --overrides overrides.json --port 8765
+"""
+import json
+import argparse
+
+import uvicorn
+
+from api import config
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the API with config overrides, for load tests.")
+    parser.add_argument("--overrides", required=True)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    with open(args.overrides, 'r') as f:
+        for name, value in json.load(f).items():
+            setattr(config, name, value)
+    # Imported after the overrides so module-level setup sees them
+    from api.main import app
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
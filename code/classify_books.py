@@ -1,14 +1,22 @@
 import json
 import pandas as pd
 import torch
-from transformers import pipeline, AutoTokenizer
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
 from tqdm import tqdm
 import logging
 import os
 from datetime import datetime
 from bs4 import BeautifulSoup
 import re
+import hashlib
 import numpy as np
+import argparse
+import multiprocessing as mp
+import sys
+
+# The project root, for helpers shared with the api package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from api.jsonl import read_jsonl
 
 # --- Setup Logging ---
 log_dir = "logs"
@@ -23,9 +31,10 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# --- Temporary Saves Directory ---
-temp_save_dir = "temp_saves"
-os.makedirs(temp_save_dir, exist_ok=True)
+# --- Classification Ledger ---
+# Append-only JSONL files of finished books; every *.jsonl file in the directory is read back,
+# so shard workers (or other machines) can each write their own file.
+ledger_dir = "classification_ledger"
 
 def load_json_data(file_path):
     """Load JSON file safely."""
@@ -59,30 +68,134 @@ def clean_text_for_classification(text):
     text = re.sub(r'\s+', ' ', text).strip().lower()
     return text
 
-def classify_books(json_data, candidate_labels, batch_size=8, max_length=512, save_interval=100, chunk_stride=128):
+# Hypothesis template of the transformers zero-shot-classification pipeline
+HYPOTHESIS_TEMPLATE = "This example is {}."
+
+def load_nli_model(model_name, device):
+    """Tokenizer, NLI model and the (contradiction, entailment) logit columns used for zero-shot scoring."""
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name).to(device).eval()
+    # Same label lookup as the zero-shot pipeline
+    entailment_id = next((i for label, i in model.config.label2id.items() if label.lower().startswith("entail")), -1)
+    contradiction_id = -1 if entailment_id == 0 else 0
+    return tokenizer, model, (contradiction_id, entailment_id)
+
+def chunk_books(tokenizer, contents, max_length=512, chunk_stride=128):
+    """Overlapping token chunks of every book, as (book position, chunk token ids without special tokens)."""
+    encoded = tokenizer(
+        list(contents),
+        max_length=max_length,
+        truncation=True,
+        return_overflowing_tokens=True,
+        stride=chunk_stride,
+        return_special_tokens_mask=True,
+    )
+    chunks = []
+    for ids, special, book in zip(encoded['input_ids'], encoded['special_tokens_mask'], encoded['overflow_to_sample_mapping']):
+        content_ids = [token for token, is_special in zip(ids, special) if not is_special]
+        if content_ids:
+            chunks.append((book, content_ids))
+    return chunks
+
+def score_chunks(tokenizer, model, logit_ids, chunks, candidate_labels, batch_size=8, device="cpu"):
+    """Multi-label entailment scores, shape (len(chunks), len(candidate_labels)).
+
+    Premise and hypothesis ids are joined directly (the chunks are already tokenized, so nothing
+    is decoded and re-tokenized), and chunks are sorted by length so each padded batch of
+    `batch_size` chunks x all labels wastes little compute. Chunks of a failed batch stay NaN.
     """
-    Classify books using Zero-Shot Classification with text chunking and mean score aggregation.
+    hypotheses = tokenizer([HYPOTHESIS_TEMPLATE.format(label) for label in candidate_labels], add_special_tokens=False)['input_ids']
+    scores = np.full((len(chunks), len(candidate_labels)), np.nan, dtype=np.float32)
+    order = sorted(range(len(chunks)), key=lambda i: len(chunks[i][1]))
+
+    for start in tqdm(range(0, len(order), batch_size), desc="Classifying chunks", leave=False):
+        batch = order[start:start + batch_size]
+        pairs = [tokenizer.build_inputs_with_special_tokens(chunks[i][1], hypothesis) for i in batch for hypothesis in hypotheses]
+        inputs = tokenizer.pad({"input_ids": pairs}, return_tensors="pt")
+        try:
+            with torch.no_grad():
+                logits = model(input_ids=inputs['input_ids'].to(device), attention_mask=inputs['attention_mask'].to(device)).logits
+        except Exception as e:
+            logger.error(f"Error classifying a batch of {len(batch)} chunks: {e}")
+            continue
+        # Softmax over contradiction vs. entailment, independently per label
+        pair_scores = torch.softmax(logits[:, list(logit_ids)].float(), dim=-1)[:, 1]
+        scores[batch] = pair_scores.view(len(batch), len(candidate_labels)).cpu().numpy()
+    return scores
+
+def aggregate_book_scores(chunks, chunk_scores, n_books, candidate_labels):
+    """Mean chunk score per book and label, plus a per-book mask of books whose chunks all scored.
+
+    Failed (NaN) chunks are left out of the mean; books without scored chunks get 0.0.
     """
-    device = 0 if torch.cuda.is_available() else -1
-    if device == 0:
-        logger.info("Using GPU for classification.")
-        torch.cuda.empty_cache()
-    else:
-        logger.info("Using CPU for classification.")
+    sums = np.zeros((n_books, len(candidate_labels)))
+    counts = np.zeros((n_books, len(candidate_labels)))
+    failed = np.zeros(n_books, dtype=np.int64)
+    books = np.array([book for book, _ in chunks], dtype=np.int64)
+    scored = ~np.isnan(chunk_scores)
+    np.add.at(sums, books, np.where(scored, chunk_scores, 0.0))
+    np.add.at(counts, books, scored)
+    np.add.at(failed, books, ~scored.all(axis=1))
+    means = np.divide(sums, counts, out=np.zeros_like(sums), where=counts > 0)
+    return [dict(zip(candidate_labels, row.tolist())) for row in means], failed == 0
 
-    try:
-        model_name = "facebook/bart-large-mnli"
-        classifier = pipeline(
-            "zero-shot-classification",
-            model=model_name,
-            device=device
-        )
-        tokenizer = AutoTokenizer.from_pretrained(model_name)
-        logger.info(f"Loaded model and tokenizer: {model_name}.")
-    except Exception as e:
-        logger.error(f"Error loading model or tokenizer: {e}", exc_info=True)
-        return None
+def model_identifier(backend, model_name, head_path=None):
+    """What produced the scores, for the ledger key; plain model name for the NLI backend."""
+    if backend == "nli":
+        return model_name
+    identifier = f"{backend}:{model_name}"
+    if head_path:
+        with open(head_path, 'rb') as f:
+            identifier += ":" + hashlib.sha256(f.read()).hexdigest()[:16]
+    return identifier
+
+# Chunks per forward pass when not given: an NLI pass pairs every chunk with every label
+DEFAULT_BATCH_SIZES = {"nli": 8, "similarity": 64, "distilled": 64}
+
+def load_scorer(backend, model_name, candidate_labels, device, batch_size=None, head_path=None):
+    """Tokenizer and a function scoring tokenized chunks, shape (len(chunks), len(candidate_labels)).
+
+    `batch_size` is chunks per forward pass: each paired with every label for the NLI backend,
+    one encoder input each for the embedding backends.
+    """
+    batch_size = batch_size or DEFAULT_BATCH_SIZES[backend]
+    if backend == "nli":
+        tokenizer, model, logit_ids = load_nli_model(model_name, device)
+        return tokenizer, lambda chunks: score_chunks(tokenizer, model, logit_ids, chunks, candidate_labels, batch_size=batch_size, device=device)
+    # One encoder pass per chunk instead of one NLI pass per (chunk, label) pair
+    from embedding_classifier import EmbeddingScorer
+    scorer = EmbeddingScorer(model_name, candidate_labels, mode=backend, head_path=head_path, device=device)
+    return scorer.tokenizer, lambda chunks: scorer.score_chunks(chunks, batch_size=batch_size)
+
+def ledger_key(content, candidate_labels, model_name, max_length, chunk_stride):
+    """Identifies a classification result: cleaned content, label set, model and chunking."""
+    payload = json.dumps([content, sorted(candidate_labels), model_name, max_length, chunk_stride], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def load_ledger(directory):
+    """ledger key -> classifications, from every ledger file in `directory`."""
+    done = {}
+    if os.path.isdir(directory):
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".jsonl"):
+                for record in read_jsonl(os.path.join(directory, name)):
+                    done[record['key']] = record['classifications']
+    return done
 
+def classify_books(json_data, candidate_labels, batch_size=None, max_length=512, save_interval=100, chunk_stride=128,
+                   model_name=None, ledger_dir=ledger_dir, ledger_name="ledger", backend="nli", head_path=None):
+    """
+    Classify books using Zero-Shot Classification with text chunking and mean score aggregation.
+
+    `backend` is "nli" (zero-shot BART-MNLI) or one of the single-pass embedding backends in
+    embedding_classifier.py ("similarity", or "distilled" with a trained `head_path`).
+
+    Books already in the ledger (same cleaned content, labels, model and chunking) are not
+    classified again. The rest are processed `save_interval` at a time, appending each finished
+    group to `<ledger_dir>/<ledger_name>.jsonl`; within a group every (book, chunk) pair is
+    flattened and scored in padded, length-sorted batches of `batch_size` chunks (default per
+    backend, see `load_scorer`).
+    """
     df = pd.DataFrame(json_data)
     if df.empty:
         logger.error("Empty data, cannot classify.")
@@ -93,78 +206,135 @@ def classify_books(json_data, candidate_labels, batch_size=8, max_length=512, sa
     df['word_count'] = df['content'].apply(lambda x: len(x.split()))
     logger.info(f"Number of books to classify after cleaning: {len(df)}")
 
-    final_classifications = []
+    if backend == "nli":
+        model_name = model_name or "facebook/bart-large-mnli"
+    else:
+        from embedding_classifier import DEFAULT_ENCODER, MAX_LENGTH
+        model_name = model_name or DEFAULT_ENCODER
+        max_length = min(max_length, MAX_LENGTH)
+    identifier = model_identifier(backend, model_name, head_path)
+    keys = [ledger_key(content, candidate_labels, identifier, max_length, chunk_stride) for content in df['content']]
+    contents_by_key = dict(zip(keys, df['content']))
+    ledger = load_ledger(ledger_dir)
+    todo = [key for key in contents_by_key if key not in ledger]
+    logger.info(f"{len(keys) - len(todo)} books found in the ledger, {len(todo)} to classify.")
 
-    for idx, row in tqdm(df.iterrows(), total=len(df), desc="Classifying books"):
-        book_content = row['content']
-        
-        # This will hold scores for each label from all chunks
-        # e.g., {'Leadership': [0.9, 0.85], 'Productivity': [0.2, 0.3]}
-        chunk_scores = {label: [] for label in candidate_labels}
+    if todo:
+        device = "cuda:0" if torch.cuda.is_available() else "cpu"
+        if device != "cpu":
+            logger.info("Using GPU for classification.")
+            torch.cuda.empty_cache()
+        else:
+            logger.info("Using CPU for classification.")
 
-        if not book_content.strip():
-            # If content is empty, append zero scores for all labels
-            final_classifications.append({label: 0.0 for label in candidate_labels})
-            continue
-        
-        # Tokenize the entire content and create chunks
-        tokenized_content = tokenizer(
-            book_content,
-            max_length=max_length,
-            truncation=True,
-            return_overflowing_tokens=True,
-            stride=chunk_stride,
-            padding=True,
-            return_tensors="pt"
-        )
-        
-        input_ids_chunks = tokenized_content['input_ids']
-
-        if input_ids_chunks.shape[0] == 0:
-            final_classifications.append({label: 0.0 for label in candidate_labels})
-            continue
+        try:
+            tokenizer, score = load_scorer(backend, model_name, candidate_labels, device, batch_size=batch_size, head_path=head_path)
+            logger.info(f"Loaded model and tokenizer: {model_name} ({backend} backend).")
+        except Exception as e:
+            logger.error(f"Error loading model or tokenizer: {e}", exc_info=True)
+            return None
 
-        # Convert token chunks back to string chunks for the pipeline
-        chunk_texts = [tokenizer.decode(ids, skip_special_tokens=True) for ids in input_ids_chunks]
-
-        # Classify each chunk
-        for chunk_text in chunk_texts:
-            try:
-                result = classifier(
-                    chunk_text,
-                    candidate_labels,
-                    multi_label=True
-                )
-                # Store the score for each label from this chunk
-                for label, score in zip(result['labels'], result['scores']):
-                    chunk_scores[label].append(score)
-            except Exception as e:
-                logger.error(f"Error classifying a chunk for book '{row['title']}': {e}")
-        
-        
-        aggregated_scores = {label: 0.0 for label in candidate_labels}
-        for label, scores in chunk_scores.items():
-            if scores:
-                aggregated_scores[label] = np.mean(scores)
-
-        final_classifications.append(aggregated_scores)
-
-        # Save progress intermittently
-        if (len(final_classifications) % save_interval == 0) or (len(final_classifications) == len(df)):
-            temp_df_to_save = df.iloc[:len(final_classifications)].copy()
-            temp_df_to_save['classifications'] = final_classifications
-            save_classified_data(temp_df_to_save, os.path.join(temp_save_dir, f'temp_classified_books_{len(final_classifications)}.json'))
-            logger.info(f"Saved temporary data up to book {len(final_classifications)}")
-
-    df['classifications'] = final_classifications
+        partial = []
+        os.makedirs(ledger_dir, exist_ok=True)
+        with open(os.path.join(ledger_dir, f"{ledger_name}.jsonl"), 'a', encoding='utf-8') as ledger_file:
+            for start in tqdm(range(0, len(todo), save_interval), desc="Classifying books"):
+                group = todo[start:start + save_interval]
+                chunks = chunk_books(tokenizer, [contents_by_key[key] for key in group], max_length=max_length, chunk_stride=chunk_stride)
+                chunk_scores = score(chunks)
+                book_scores, fully_scored = aggregate_book_scores(chunks, chunk_scores, len(group), candidate_labels)
+                for key, classifications, complete in zip(group, book_scores, fully_scored):
+                    ledger[key] = classifications
+                    # Books with a failed chunk keep their partial scores for this run only, so reruns retry them
+                    if complete:
+                        ledger_file.write(json.dumps({"key": key, "classifications": classifications}) + "\n")
+                    else:
+                        partial.append(key)
+                ledger_file.flush()
+        if partial:
+            partial_keys = set(partial)
+            titles = [title for key, title in zip(keys, df.get('title', keys)) if key in partial_keys]
+            logger.warning(f"{len(partial)} books had chunks that failed to classify; their scores are partial and "
+                           f"were not added to the ledger, so the next run retries them: {titles}")
+
+    df['classifications'] = [ledger[key] for key in keys]
     logger.info(f"Finished classifying all {len(df)} books.")
 
     return df
 
+def shard_path(shard_dir, shard_index, num_shards):
+    return os.path.join(shard_dir, f"shard-{shard_index:05d}-of-{num_shards:05d}.json")
+
+def select_shard(json_data, shard_index, num_shards):
+    """Deterministic round-robin shard of the input; each record keeps its input position as `source_index`."""
+    return [dict(book, source_index=i) for i, book in enumerate(json_data) if i % num_shards == shard_index]
+
+def classify_shard(shard_data, shard_index, num_shards, candidate_labels, shard_dir, torch_threads=None, **classify_kwargs):
+    """Classifies one shard (typically in its own process) and writes it to its own partial result file."""
+    if torch_threads:
+        torch.set_num_threads(torch_threads)
+    os.makedirs(shard_dir, exist_ok=True)
+    path = shard_path(shard_dir, shard_index, num_shards)
+    if not shard_data:
+        df = pd.DataFrame(columns=['source_index'])
+    else:
+        df = classify_books(shard_data, candidate_labels, ledger_name=f"shard-{shard_index:05d}-of-{num_shards:05d}", **classify_kwargs)
+    if df is None:
+        raise RuntimeError(f"Classification of shard {shard_index}/{num_shards} failed.")
+    # Written under a temporary name, so a crashed worker never leaves a truncated shard behind
+    save_classified_data(df, path + ".tmp")
+    os.replace(path + ".tmp", path)
+    return path
+
+def merge_shards(shard_dir, num_shards, output_file):
+    """Combines all shard files into one classified file in the original input order."""
+    missing = [i for i in range(num_shards) if not os.path.exists(shard_path(shard_dir, i, num_shards))]
+    if missing:
+        raise FileNotFoundError(f"Missing shards {missing} of {num_shards} in {shard_dir}")
+    records = []
+    for i in range(num_shards):
+        records.extend(load_json_data(shard_path(shard_dir, i, num_shards)))
+    df = pd.DataFrame(records).sort_values('source_index', kind='stable').drop(columns='source_index')
+    save_classified_data(df.reset_index(drop=True), output_file)
+    return df
+
+def classify_sharded(json_data, candidate_labels, num_workers, shard_dir, torch_threads=None, **classify_kwargs):
+    """Runs one worker process per shard on this machine; each loads its own copy of the model."""
+    torch_threads = torch_threads or max(1, (os.cpu_count() or 1) // num_workers)
+    ctx = mp.get_context("spawn")
+    with ctx.Pool(num_workers) as pool:
+        jobs = [
+            pool.apply_async(classify_shard, (select_shard(json_data, i, num_workers), i, num_workers, candidate_labels, shard_dir, torch_threads), classify_kwargs)
+            for i in range(num_workers)
+        ]
+        for job in jobs:
+            logger.info(f"Shard written: {job.get()}")
+
 if __name__ == "__main__":
-    input_file = "D:\\Graduation Project\\project\\data\\enriched_books_only_covers.json"
-    output_file = "D:\\Graduation Project\\project\\data\\classified_books.json"
-    
+    parser = argparse.ArgumentParser(description="Zero-shot classification of the book catalog.")
+    parser.add_argument("--input", default="D:\\Graduation Project\\project\\data\\enriched_books_only_covers.json")
+    parser.add_argument("--output", default="D:\\Graduation Project\\project\\data\\classified_books.json")
+    parser.add_argument("--backend", default="nli", choices=["nli", "similarity", "distilled"],
+                        help="nli: zero-shot BART-MNLI; similarity/distilled: one sentence-encoder pass per chunk")
+    parser.add_argument("--model", default=None, help="NLI model or sentence encoder (default depends on --backend)")
+    parser.add_argument("--head", default=None, help="Trained label head for --backend distilled")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="Chunks per forward pass: nli pairs each with every label (default 8); "
+                             "similarity/distilled embed each once (default 64)")
+    parser.add_argument("--workers", type=int, default=1, help="Local worker processes, one shard each, merged at the end")
+    parser.add_argument("--torch-threads", type=int, default=None, help="Torch threads per worker (default: cores / workers)")
+    parser.add_argument("--ledger-dir", default=ledger_dir, help="Classified-book ledger; reruns skip books already in it")
+    parser.add_argument("--shard-dir", default="classification_shards")
+    parser.add_argument("--shard-index", type=int, default=None, help="Classify only this shard (multi-machine runs)")
+    parser.add_argument("--num-shards", type=int, default=None)
+    parser.add_argument("--merge", action="store_true", help="Only merge --num-shards shard files from --shard-dir into --output")
+    args = parser.parse_args()
+    if (args.merge or args.shard_index is not None) and args.num_shards is None:
+        parser.error("--merge and --shard-index need --num-shards")
+    if args.num_shards is not None and args.num_shards < 1:
+        parser.error("--num-shards must be at least 1")
+    if args.shard_index is not None and not 0 <= args.shard_index < args.num_shards:
+        parser.error(f"--shard-index must be between 0 and {args.num_shards - 1}")
+
     candidate_labels = [
         "Personal Development", "Career Success", "Strengthening Relationships",
         "Habit Improvement", "Productivity Enhancement", "Building Self-Confidence",
@@ -172,11 +342,30 @@ if __name__ == "__main__":
         "Critical Thinking", "Finance and Investment", "Happiness and Well-Being",
         "Real-Life Stories", "Practical Steps", "Inspiration and Motivation"
     ]
-    
-    json_data = load_json_data(input_file)
-    if json_data:
-        df_classified = classify_books(json_data, candidate_labels)
-        if df_classified is not None:
-            save_classified_data(df_classified, output_file)
-            print("\nClassification process completed.")
-            print(df_classified[['title', 'classifications']].head())
\ No newline at end of file
+
+    classify_kwargs = dict(batch_size=args.batch_size, model_name=args.model, ledger_dir=args.ledger_dir,
+                           backend=args.backend, head_path=args.head)
+
+    if args.merge:
+        df_classified = merge_shards(args.shard_dir, args.num_shards, args.output)
+        print(f"\nMerged {args.num_shards} shards ({len(df_classified)} books).")
+    elif args.shard_index is not None:
+        json_data = load_json_data(args.input)
+        if json_data:
+            shard = select_shard(json_data, args.shard_index, args.num_shards)
+            classify_shard(shard, args.shard_index, args.num_shards, candidate_labels, args.shard_dir,
+                           torch_threads=args.torch_threads, **classify_kwargs)
+    else:
+        json_data = load_json_data(args.input)
+        if json_data:
+            if args.workers > 1:
+                classify_sharded(json_data, candidate_labels, args.workers, args.shard_dir,
+                                 torch_threads=args.torch_threads, **classify_kwargs)
+                df_classified = merge_shards(args.shard_dir, args.workers, args.output)
+            else:
+                df_classified = classify_books(json_data, candidate_labels, **classify_kwargs)
+                if df_classified is not None:
+                    save_classified_data(df_classified, args.output)
+            if df_classified is not None:
+                print("\nClassification process completed.")
+                print(df_classified[['title', 'classifications']].head())
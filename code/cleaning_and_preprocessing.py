@@ -1,17 +1,23 @@
+import os
 import json
+import hashlib
+import argparse
 import pandas as pd
 import re
 from tqdm import tqdm
+from concurrent.futures import ProcessPoolExecutor
 from rake_nltk import Rake
 from langdetect import detect, DetectorFactory
 import nltk
 from bs4 import BeautifulSoup
 
 
-nltk.download('stopwords')
-nltk.download('punkt')
 DetectorFactory.seed = 0  
 
+def ensure_nltk_data(quiet=False):
+    nltk.download('stopwords', quiet=quiet)
+    nltk.download('punkt', quiet=quiet)
+
 def load_json_data(file_path):
     try:
         with open(file_path, 'r', encoding='utf-8') as file:
@@ -49,48 +55,162 @@ def is_english(text):
     except:
         return False
 
+_rake = None
+
 def extract_keywords(text, num_keywords=7):
-    rake = Rake()
+    # One Rake (and its stopword list) per process; extraction resets its state
+    global _rake
+    if _rake is None:
+        _rake = Rake()
+    rake = _rake
     rake.extract_keywords_from_text(text)
     
     ranked_phrases = rake.get_ranked_phrases()
     return ranked_phrases[:num_keywords]
 
+def preprocess_book(book, min_length=100, max_length=6000):
+    """Cleaned record for one raw book, or None if it is filtered out."""
+    title = book.get('title', '')
+    url = book.get('url', '')
+    content = book.get('content', '')
+
+    cleaned_content = clean_text(content)
+
+    if (cleaned_content and
+        min_length <= len(cleaned_content) <= max_length and
+        is_english(cleaned_content) and
+        title.strip()):
+
+        return {'title': title, 'url': url, 'content': cleaned_content, 'keywords': extract_keywords(cleaned_content)}
+    return None
+
 def preprocess_books_data(json_data, min_length=100, max_length=6000):
+    records = [preprocess_book(book, min_length, max_length) for book in tqdm(json_data, desc="Processing books")]
+    df = pd.DataFrame([record for record in records if record is not None], columns=['title', 'url', 'content', 'keywords'])
 
-    titles = []
-    urls = []
-    contents = []
-    keywords_list = []
-    
-    for book in tqdm(json_data, desc="Processing books"):
-        title = book.get('title', '')
-        url = book.get('url', '')
-        content = book.get('content', '')
-        
-        cleaned_content = clean_text(content)
-        
-        if (cleaned_content and 
-            min_length <= len(cleaned_content) <= max_length and 
-            is_english(cleaned_content) and 
-            title.strip()):
-            
-            titles.append(title)
-            urls.append(url)
-            contents.append(cleaned_content)
-            keywords_list.append(extract_keywords(cleaned_content))
-    
-    df = pd.DataFrame({
-        'title': titles,
-        'url': urls,
-        'content': contents,
-        'keywords': keywords_list
-    })
-    
     df = df.drop_duplicates(subset=['title', 'content'])
     
     return df
 
+def iter_books(file_path, read_size=1 << 20):
+    """Yields raw book records one at a time from a JSON array or a JSONL file, without loading the whole file."""
+    decoder = json.JSONDecoder()
+    with open(file_path, 'r', encoding='utf-8') as file:
+        buffer = file.read(read_size).lstrip()
+        if not buffer.startswith('['):
+            # JSONL: one record per line
+            file.seek(0)
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+            return
+
+        pos = 1
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos < len(buffer) and buffer[pos] == ']':
+                return
+            try:
+                record, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # The next record is cut off at the end of the buffer
+                more = file.read(read_size)
+                if not more:
+                    raise
+                buffer, pos = buffer[pos:] + more, 0
+                continue
+            yield record
+            if pos > read_size:
+                buffer, pos = buffer[pos:], 0
+
+def _preprocess_chunk(books, min_length, max_length):
+    return [preprocess_book(book, min_length, max_length) for book in books]
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+class _RecordWriter:
+    """Writes records as they arrive, as a JSON array (same layout as save_preprocessed_data) or JSONL."""
+
+    def __init__(self, output_file, jsonl):
+        self.jsonl = jsonl
+        self.file = open(output_file, 'w', encoding='utf-8')
+        self.count = 0
+        if not self.jsonl:
+            self.file.write('[')
+
+    def write(self, record):
+        if self.jsonl:
+            self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        else:
+            item = json.dumps(record, ensure_ascii=False, indent=4).replace('\n', '\n    ')
+            self.file.write((',\n    ' if self.count else '\n    ') + item)
+        self.count += 1
+
+    def close(self):
+        if not self.jsonl:
+            self.file.write('\n]' if self.count else ']')
+        self.file.close()
+
+    def abort(self):
+        # Left unterminated, so a partial output is never valid JSON
+        self.file.close()
+
+def preprocess_books_stream(input_file, output_file, min_length=100, max_length=6000, workers=None, chunk_size=256, max_in_flight=None):
+    """Streaming, parallel version of load -> preprocess_books_data -> save_preprocessed_data.
+
+    Records are read incrementally, cleaned in chunks of `chunk_size` on a process pool and
+    written in input order as soon as their chunk is done. At most `max_in_flight` chunks are
+    queued or being processed, so memory is bounded by chunk size rather than corpus size
+    (plus one hash per kept book for de-duplication). Returns the number of books written.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or 2 * workers
+    seen = set()
+    # Written under a temporary name and renamed on success, so a failed run never leaves a
+    # truncated but valid corpus at output_file
+    tmp_file = output_file + ".tmp"
+    writer = _RecordWriter(tmp_file, jsonl=output_file.endswith('.jsonl'))
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor, \
+                tqdm(desc="Processing books", unit="book") as progress:
+            pending = []
+            chunks = _chunks(iter_books(input_file), chunk_size)
+            while True:
+                while len(pending) < max_in_flight:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    pending.append(executor.submit(_preprocess_chunk, chunk, min_length, max_length))
+                if not pending:
+                    break
+                # Oldest chunk first, so output keeps the input order
+                results = pending.pop(0).result()
+                for record in results:
+                    if record is None:
+                        continue
+                    # Same de-duplication as drop_duplicates(subset=['title', 'content'])
+                    key = hashlib.sha1(json.dumps([record['title'], record['content']]).encode('utf-8')).digest()
+                    if key not in seen:
+                        seen.add(key)
+                        writer.write(record)
+                progress.update(len(results))
+    except BaseException:
+        writer.abort()
+        os.remove(tmp_file)
+        raise
+    writer.close()
+    os.replace(tmp_file, output_file)
+    return writer.count
+
 def save_preprocessed_data(df, output_file):
     data = df.to_dict(orient='records')
     try:
@@ -102,21 +222,25 @@ def save_preprocessed_data(df, output_file):
 
 
 if __name__ == "__main__":
-    input_file = "D:\\Graduation Project\\project\\data\\books.json"
-    output_file = "D:\\Graduation Project\\project\\data\\preprocessed_books.json"
-
-    json_data = load_json_data(input_file)
-    if json_data:
-
-        df = preprocess_books_data(json_data, min_length=100, max_length=6000)
-
-        save_preprocessed_data(df, output_file)
-        print(f"Number of books after preprocessing: {len(df)}")
-        print("\nSample of preprocessed data:")
-        print(df.head())
-
-        print("\nKeywords sample for a book:")
-        if not df.empty:
-            print(df['keywords'].iloc[0])
-        else:
-            print("No books processed to show keywords sample.")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Clean, filter and extract keywords from scraped books.")
+    parser.add_argument("--input", default="D:\\Graduation Project\\project\\data\\books.json", help="JSON array or JSONL")
+    parser.add_argument("--output", default="D:\\Graduation Project\\project\\data\\preprocessed_books.json", help="JSON array, or JSONL if it ends in .jsonl")
+    parser.add_argument("--min-length", type=int, default=100)
+    parser.add_argument("--max-length", type=int, default=6000)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--chunk-size", type=int, default=256, help="Books per task sent to a worker")
+    parser.add_argument("--max-in-flight", type=int, default=None, help="Chunks queued at once (default: 2 x workers)")
+    args = parser.parse_args()
+
+    ensure_nltk_data()
+    count = preprocess_books_stream(args.input, args.output, min_length=args.min_length, max_length=args.max_length,
+                                    workers=args.workers, chunk_size=args.chunk_size, max_in_flight=args.max_in_flight)
+    print(f"Books saved in: {args.output}")
+    print(f"Number of books after preprocessing: {count}")
+
+    print("\nKeywords sample for a book:")
+    first = next(iter_books(args.output), None) if count else None
+    if first is not None:
+        print(first['keywords'])
+    else:
+        print("No books processed to show keywords sample.")
@@ -0,0 +1,184 @@
+"""Single-pass alternatives to the zero-shot NLI classifier.
+
+The NLI backend runs one BART-MNLI forward pass per (chunk, label) pair, i.e. 15 per chunk.
+These backends embed each chunk once with a small sentence encoder and score all labels
+against precomputed label vectors:
+
+- "similarity": cosine similarity between the chunk and the label hypothesis embeddings,
+  mapped to [0, 1]. Needs no training, but is not calibrated to the NLI scores.
+- "distilled": a linear head per label fitted (ridge regression on logits) to reproduce the
+  NLI scores of an existing classified_books.json, applied to the chunk embeddings.
+
+Both produce the same `classifications` schema through `classify_books(..., backend=...)`.
+
+    python code/embedding_classifier.py train --teacher data/classified_books.json --output data/distilled_head.npz
+    python code/classify_books.py --backend distilled --head data/distilled_head.npz --output distilled_books.json
+    python code/embedding_classifier.py agreement --reference data/classified_books.json --candidate distilled_books.json
+"""
+import json
+import argparse
+import logging
+
+import numpy as np
+import torch
+from transformers import AutoTokenizer, AutoModel
+from tqdm import tqdm
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ENCODER = "sentence-transformers/all-MiniLM-L6-v2"
+HYPOTHESIS_TEMPLATE = "This example is {}."
+# Sentence encoders are trained on short inputs, so chunks are shorter than the NLI backend's 512 tokens
+MAX_LENGTH = 256
+
+
+def embed_token_ids(tokenizer, model, token_ids, batch_size=64, device="cpu"):
+    """L2-normalized mean-pooled embeddings of already tokenized texts, in length-sorted padded batches."""
+    embeddings = np.zeros((len(token_ids), model.config.hidden_size), dtype=np.float32)
+    order = sorted(range(len(token_ids)), key=lambda i: len(token_ids[i]))
+    for start in range(0, len(order), batch_size):
+        batch = order[start:start + batch_size]
+        inputs = tokenizer.pad({"input_ids": [tokenizer.build_inputs_with_special_tokens(token_ids[i]) for i in batch]}, return_tensors="pt")
+        mask = inputs['attention_mask'].to(device)
+        with torch.no_grad():
+            hidden = model(input_ids=inputs['input_ids'].to(device), attention_mask=mask).last_hidden_state
+        pooled = (hidden * mask.unsqueeze(-1)).sum(1) / mask.sum(1, keepdim=True)
+        embeddings[batch] = torch.nn.functional.normalize(pooled, dim=-1).cpu().numpy()
+    return embeddings
+
+
+class EmbeddingScorer:
+    """Scores tokenized chunks against every label with one encoder pass per chunk."""
+
+    def __init__(self, model_name, candidate_labels, mode="similarity", head_path=None, device="cpu"):
+        self.model_name = model_name
+        self.candidate_labels = list(candidate_labels)
+        self.mode = mode
+        self.device = device
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = AutoModel.from_pretrained(model_name).to(device).eval()
+
+        if mode == "similarity":
+            hypotheses = self.tokenizer([HYPOTHESIS_TEMPLATE.format(label) for label in self.candidate_labels], add_special_tokens=False)['input_ids']
+            self.label_vectors = self.embed(hypotheses)
+        elif mode == "distilled":
+            if head_path is None:
+                raise ValueError("The distilled backend needs a trained head (see `embedding_classifier.py train`).")
+            head = np.load(head_path)
+            head_labels = head['labels'].tolist()
+            if str(head['encoder']) != model_name or not set(self.candidate_labels) <= set(head_labels):
+                raise ValueError(f"Head {head_path} was trained for {head['encoder']} with labels {head_labels}.")
+            columns = [head_labels.index(label) for label in self.candidate_labels]
+            self.weights, self.bias = head['weights'][:, columns], head['bias'][columns]
+        else:
+            raise ValueError(f"Unknown embedding backend {mode!r}")
+
+    def embed(self, token_ids, batch_size=64):
+        return embed_token_ids(self.tokenizer, self.model, token_ids, batch_size=batch_size, device=self.device)
+
+    def score_chunks(self, chunks, batch_size=64):
+        """Scores in [0, 1], shape (len(chunks), len(candidate_labels))."""
+        embeddings = self.embed([ids for _, ids in chunks], batch_size=batch_size)
+        if self.mode == "similarity":
+            return (1.0 + embeddings @ self.label_vectors.T) / 2.0
+        return 1.0 / (1.0 + np.exp(-(embeddings @ self.weights + self.bias)))
+
+
+def train_head(teacher_path, output_path, model_name=DEFAULT_ENCODER, l2=1.0, max_length=MAX_LENGTH, chunk_stride=128, device="cpu"):
+    """Fits one ridge regression per label from chunk embeddings to the logit of the teacher's book score.
+
+    Every chunk of a book is trained towards that book's NLI scores, matching how chunk
+    scores are mean-aggregated per book at inference time.
+    """
+    from classify_books import chunk_books
+
+    with open(teacher_path, 'r', encoding='utf-8') as f:
+        books = [book for book in json.load(f) if isinstance(book.get('classifications'), dict) and book.get('content')]
+    labels = sorted({label for book in books for label in book['classifications']})
+    teacher = np.array([[book['classifications'].get(label, 0.0) for label in labels] for book in books], dtype=np.float64)
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    chunks = chunk_books(tokenizer, [book['content'] for book in books], max_length=max_length, chunk_stride=chunk_stride)
+    model = AutoModel.from_pretrained(model_name).to(device).eval()
+    logger.info(f"Embedding {len(chunks)} chunks of {len(books)} books with {model_name}...")
+    embeddings = np.concatenate([
+        embed_token_ids(tokenizer, model, [ids for _, ids in chunks[start:start + 4096]], device=device)
+        for start in tqdm(range(0, len(chunks), 4096), desc="Embedding")
+    ]).astype(np.float64)
+
+    targets = np.clip(teacher[[book for book, _ in chunks]], 1e-4, 1 - 1e-4)
+    targets = np.log(targets / (1 - targets))
+    # Centered closed-form ridge regression; the bias is the target mean
+    x_mean, y_mean = embeddings.mean(0), targets.mean(0)
+    x = embeddings - x_mean
+    weights = np.linalg.solve(x.T @ x + l2 * np.eye(x.shape[1]), x.T @ (targets - y_mean))
+    bias = y_mean - x_mean @ weights
+    np.savez(output_path, weights=weights.astype(np.float32), bias=bias.astype(np.float32),
+             labels=np.array(labels), encoder=np.array(model_name))
+    logger.info(f"Saved distilled head for {len(labels)} labels to {output_path}")
+    return output_path
+
+
+def agreement(reference_path, candidate_path, top_k=3):
+    """How closely a candidate classification reproduces the reference (NLI) scores, matched by title."""
+    def load(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return {book['title']: book['classifications'] for book in json.load(f) if isinstance(book.get('classifications'), dict)}
+
+    reference, candidate = load(reference_path), load(candidate_path)
+    titles = [title for title in reference if title in candidate]
+    labels = sorted(set.intersection(*(set(reference[t]) & set(candidate[t]) for t in titles))) if titles else []
+    if not titles or not labels:
+        return {"books": 0}
+    ref = np.array([[reference[t][label] for label in labels] for t in titles])
+    cand = np.array([[candidate[t][label] for label in labels] for t in titles])
+
+    def ranks(matrix, axis):
+        return np.argsort(np.argsort(matrix, axis=axis), axis=axis).astype(np.float64)
+
+    def correlation(a, b):
+        a, b = a - a.mean(0), b - b.mean(0)
+        denominator = np.sqrt((a * a).sum(0) * (b * b).sum(0))
+        return np.divide((a * b).sum(0), denominator, out=np.full(a.shape[1], np.nan), where=denominator > 0)
+
+    # Per label: does the candidate order books like the reference does? (drives recommendations)
+    per_label_spearman = correlation(ranks(ref, 0), ranks(cand, 0))
+    ref_top = np.argsort(-ref, axis=1)[:, :top_k]
+    cand_top = np.argsort(-cand, axis=1)[:, :top_k]
+    top_k_overlap = np.mean([len(set(a) & set(b)) / top_k for a, b in zip(ref_top, cand_top)])
+    return {
+        "books": len(titles),
+        "labels": len(labels),
+        "mean_absolute_error": float(np.abs(ref - cand).mean()),
+        "mean_pearson_per_label": float(np.nanmean(correlation(ref, cand))),
+        "mean_spearman_per_label": float(np.nanmean(per_label_spearman)),
+        "spearman_per_label": dict(zip(labels, per_label_spearman.tolist())),
+        "top1_label_agreement": float((ref_top[:, 0] == cand_top[:, 0]).mean()),
+        f"top{top_k}_label_overlap": float(top_k_overlap),
+    }
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Train the distilled label head, or compare two classified files.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    train = subparsers.add_parser("train", help="Fit a label head on an NLI-classified catalog")
+    train.add_argument("--teacher", required=True, help="classified_books.json produced by the NLI backend")
+    train.add_argument("--output", required=True)
+    train.add_argument("--encoder", default=DEFAULT_ENCODER)
+    train.add_argument("--l2", type=float, default=1.0)
+    compare = subparsers.add_parser("agreement", help="Agreement of a candidate classification with the reference")
+    compare.add_argument("--reference", required=True)
+    compare.add_argument("--candidate", required=True)
+    compare.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    if args.command == "train":
+        train_head(args.teacher, args.output, model_name=args.encoder, l2=args.l2,
+                   device="cuda:0" if torch.cuda.is_available() else "cpu")
+    else:
+        report = agreement(args.reference, args.candidate)
+        print(json.dumps(report, indent=4))
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(report, f, indent=4)